@@ -1,6 +1,6 @@
 import streamlit as st
-from eda import run_eda_app
-from optimize import run_optimize_app
+import perf
+import warmup
 #from modeling import run_model_app
 #from about import run_project_description_app
 
@@ -8,10 +8,19 @@ from optimize import run_optimize_app
 #st.config.set_option('SKLEARN_ALLOW_DEPRECATED_SKLEARN_PACKAGE_INSTALL', True) 
 
 def main():
+    # optional background preloading of the pages and datasets (environment variable WARMUP)
+    warmup.start()
     st.title('Demo Web-App: Portfolio Optimization using Monte-Carlo Simulations and Machine Learning')
     menu = ["About this Project", "Data Exploration", "Portfolio Optimization"]
     choice = st.sidebar.selectbox("Menu", menu)
+    # optional stage timings of this page run
+    if st.sidebar.checkbox('show performance', value=perf.enabled()):
+        perf.enable()
+    else:
+        perf.disable()
+    perf.reset()
 
+    # the pages are imported on first use only, so their heavy dependencies do not delay the other pages
     if choice == 'About this Project':
         st.header('About this Project')
         st.write('Disclaimer (before moving on): There have been attempts to predict stock prices using time series analysis algorithms, though they still cannot be used to place bets in the real market. This is just a demo app that does not intend in any way to “direct” people into buying stocks. Let’s get started.')
@@ -19,11 +28,15 @@ def main():
 
     elif choice == 'Data Exploration':
         st.header('Explore Live Stock Data using Yahoo Finance API')
+        from eda import run_eda_app
         run_eda_app()
 
     elif choice == 'Portfolio Optimization':
         st.header('Optimize the Portfolio using Monte-Carlo Simulations')
+        from optimize import run_optimize_app
         run_optimize_app()        
 
+    perf.render_perf_expander()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,85 @@
+# mapping for top 40 dax companies 
+dax_assets = {
+               'DAX': '^GDAXI',
+               'Linde': 'LIN',
+               'SAP': 'SAP',
+               'Deutsche Telekom': 'DTE.DE',
+               'Volkswagen': 'VOW3.DE',
+               'Siemens': 'SIE.DE',
+               'Merck': 'MRK.DE',
+               'Airbus': 'AIR.PA',
+               'Mercedes Benz': 'MBG.DE', 
+               'Bayer': 'BAYZF',
+               'BMW': 'BMW.DE',
+               'Siemens Healthineers': 'SHL.DE',
+               'Deutsche Post': 'DPW.DE',
+               'BASF': 'BAS.DE',
+               'Münchner Rück': 'MUV2.DE',
+               'Infineon': 'IFX.DE',
+               'Deutsche Börse': 'DB1:DE',
+               'RWE': 'RWE.DE',
+               'Henkel': 'HEN3.DE',
+               'Adidas': 'ADS.DE',
+               'Sartorius': 'SRT.DE',
+               'Beiersdorf': 'BEI.DE',
+               'Porsche': 'PAH3.DE',
+               'E.ON': 'EOAN.DE',
+               'Deutsche Bank': 'DB',
+               'Vonovia': 'VNA.DE',
+               'Fresenius': 'FRE.DE',
+               'Symrise': 'SY1.DE',
+               'Continental': 'CON.DE',
+               'Delivery Hero': 'DHER.F',
+               'Brenntag': 'BNR.DE',
+               'Qiagen': 'QGEN',
+               'Fresenius Medical Care': 'FMS',
+               'Siemens Energy': 'ENR.F',
+               'HeidelbergCement': 'HEI.DE',
+               'Puma': 'PUM.DE',
+               'MTU Aero Engines': 'MTX.DE',
+               'Covestro': '1COV.F',
+               'Zalando': 'ZAL.DE',
+               'HelloFresh': 'HFG.DE'
+            }
+
+mixed_assets = {
+               'DAX': '^GDAXI',
+               'Eurostoxx': '^STOXX50E',
+               'DowJones': '^DJI',
+               'Nikkei': '^N225',
+               'SP500': '^GSPC',
+               'GOLD': 'GC=F',
+               'Silver': 'SI=F',
+               'Bitcoin': 'BTC-EUR',
+                }
+
+tech_assets = {
+               'Microsoft': 'MSFT',
+               'Tesla': 'TSLA',
+               'Google': 'GOOG',
+               'Apple': 'AAPL',
+               'IBM': 'IBM',
+               'Amazon': 'AMZN',
+               'Samsung': 'SSUN.F',
+               'Intel': 'INTC',
+                }
+
+alexa_assets = {
+                'Abbott_Laboratories': 'ABT',
+                'Allianz_SE': 'ALV.DE',
+                'Google': 'GOOG',
+                'Coca_Cola': 'KO',
+                'Colgate_Palmolive': 'CL',
+                'HDFC_Bank': 'HDB',
+                'Internat_Flavors': 'IFF',
+                'Medtronic': 'MDT',
+                'Mondelez': 'MDLZ',
+                'Thermo_Fisher': 'TMO'
+               }
+
+asset_classes = {
+                 'tech assets': tech_assets,
+                 'dax top 40': dax_assets,
+                 'mixed assets': mixed_assets,
+                 'alexa assets': alexa_assets,
+                }
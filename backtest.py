@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+from perf import timed
+from covariance import NTD
+from solver import solve_tradeoff, max_sharp_ratio, max_return_under_risk
+
+
+#####################################################
+# Rolling Moments
+#####################################################
+
+class RollingMoments:
+    """Mean vector and covariance matrix of a window of daily returns, updated incrementally
+    by adding rows entering and removing rows leaving the window."""
+
+    def __init__(self, n_assets:int):
+        self.n = 0
+        self.s1 = np.zeros(n_assets)
+        self.s2 = np.zeros((n_assets, n_assets))
+
+    def add(self, rows:np.ndarray):
+        self.n += len(rows)
+        self.s1 += rows.sum(axis=0)
+        self.s2 += rows.T @ rows
+
+    def remove(self, rows:np.ndarray):
+        self.n -= len(rows)
+        self.s1 -= rows.sum(axis=0)
+        self.s2 -= rows.T @ rows
+
+    @property
+    def mean(self)->np.ndarray:
+        return self.s1 / self.n
+
+    @property
+    def cov(self)->np.ndarray:
+        mean = self.mean
+        return (self.s2 - self.n*np.outer(mean, mean)) / (self.n - 1)
+
+
+
+#####################################################
+# Walk-Forward Backtest
+#####################################################
+
+def strategies(rfr:float=0.03, max_risk:float=0.2, ntd:int=NTD)->dict:
+    """portfolio optimizers mapping (mean, covariance) of the daily returns to long-only weights"""
+    return {
+        'max sharp ratio': lambda mean, cov: max_sharp_ratio(mean, cov, rfr, n_points=20, n_refinements=2, ntd=ntd),
+        'max return under risk': lambda mean, cov: max_return_under_risk(mean, cov, max_risk, n_bisections=20, ntd=ntd)[0][0],
+        'min variance': lambda mean, cov: solve_tradeoff(mean, cov, 0.0)[0],
+        'equal weights': lambda mean, cov: np.full(len(mean), 1/len(mean)),
+    }
+
+def rebalance_positions(index:pd.DatetimeIndex, freq:str='M', min_history:int=1)->np.ndarray:
+    """positions of the first trading day of every period (e.g. 'W', 'M', 'Q') with at least min_history days before it"""
+    periods = index.to_period(freq)
+    first_days = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+    return first_days[first_days >= min_history]
+
+@timed()
+def walk_forward(stats, optimizer, window:int=750, expanding:bool=False, freq:str='M'):
+    """Walk-forward backtest: at the first trading day of every period re-optimize the weights on the preceding
+    window of daily returns (rolling, or all days so far if expanding) and hold them until the next rebalancing.
+    stats is a utils.MarketStats. Missing returns count as zero returns in the window moments.
+    Returns the daily out-of-sample portfolio returns and the weights per rebalancing date."""
+    returns = np.nan_to_num(stats.returns)
+    positions = rebalance_positions(stats.index, freq=freq, min_history=window)
+    moments = RollingMoments(returns.shape[1])
+    start, end = 0, 0
+    portfolio_returns = []
+    weights = []
+    for i, position in enumerate(positions):
+        # slide the window to [position - window, position) or grow it to [0, position)
+        moments.add(returns[end:position])
+        end = position
+        if not expanding:
+            moments.remove(returns[start:position - window])
+            start = position - window
+        w = optimizer(moments.mean, moments.cov)
+        weights.append(w)
+        # buy and hold until the next rebalancing
+        next_position = positions[i + 1] if i + 1 < len(positions) else len(returns)
+        growth = np.exp(np.cumsum(returns[position:next_position], axis=0)) @ w
+        portfolio_returns.append(growth / np.r_[1.0, growth[:-1]] - 1)
+    index = stats.index[positions[0]:] if len(positions) else stats.index[:0]
+    daily = pd.Series(np.concatenate(portfolio_returns) if portfolio_returns else [], index=index, name='portfolio return', dtype=float)
+    df_weights = pd.DataFrame(weights, index=stats.index[positions], columns=stats.columns)
+    return daily, df_weights
+
+def backtest_report(daily:pd.Series, rfr:float=0.03, ntd:int=NTD)->dict:
+    """realized annual return, volatility, sharp ratio and maximal drawdown of daily (simple) portfolio returns"""
+    wealth = (1 + daily).cumprod()
+    annual_return = wealth.iloc[-1]**(ntd / len(daily)) - 1
+    volatility = daily.std()*np.sqrt(ntd)
+    return {'annual return': annual_return,
+            'volatility': volatility,
+            'sharp ratio': (daily.mean()*ntd - rfr) / volatility,
+            'max drawdown': (wealth / wealth.cummax() - 1).min()}
@@ -0,0 +1,83 @@
+import os
+import argparse
+import multiprocessing
+from contextlib import contextmanager
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from storage import load_frame
+
+
+# set directories
+rootdir = os.getcwd()
+DATAPATH = Path(rootdir) / 'data'
+MODELPATH = Path(rootdir) / 'models'
+
+
+#####################################################
+# Batch Forecasting
+#####################################################
+
+THREAD_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+
+@contextmanager
+def _thread_limits(threads_per_worker:int):
+    """Cap the cpu threads of the numeric libraries in processes started meanwhile.
+    BLAS/OpenMP read the variables once when numpy is imported, i.e. before a spawned worker runs its initializer,
+    so they are set in this process and inherited by the workers."""
+    previous = {var: os.environ.get(var) for var in THREAD_VARS}
+    os.environ.update({var: str(threads_per_worker) for var in THREAD_VARS})
+    try:
+        yield
+    finally:
+        for var, value in previous.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+def _init_worker(threads_per_worker:int):
+    """cap the torch threads of a worker process"""
+    import torch
+    torch.set_num_threads(threads_per_worker)
+
+def _forecast_stock(datapath:str, modelpath:str, stock:str)->str:
+    """fit (or reuse) the forecast model of one stock and write it to the forecast store"""
+    from forecast_store import ForecastCache
+    from utils import make_forecast
+    df = load_frame(Path(datapath) / 'data')
+    make_forecast(df, stock, cache=ForecastCache(modelpath))
+    return stock
+
+def forecast_all(datapath=DATAPATH, modelpath=MODELPATH, stocks:list=None, max_workers:int=None, threads_per_worker:int=1, on_progress=None)->dict:
+    """Make the forecasts of all stocks in data (or the given ones) on a process pool and write them to the forecast store.
+    Every worker is limited to threads_per_worker cpu threads, on_progress(n_done, n_total, stock, error) is called after each stock.
+    Returns the error of every failed stock."""
+    if stocks is None:
+        stocks = list(load_frame(Path(datapath) / 'data').columns)
+    if max_workers is None:
+        max_workers = max(1, (os.cpu_count() or 1) // threads_per_worker)
+    errors = {}
+    # spawn fresh workers instead of forking the (possibly multi-threaded) web process
+    with _thread_limits(threads_per_worker), ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'), 
+                             initializer=_init_worker, initargs=(threads_per_worker,)) as pool:
+        futures = {pool.submit(_forecast_stock, str(datapath), str(modelpath), stock): stock for stock in stocks}
+        for n_done, future in enumerate(as_completed(futures), start=1):
+            stock = futures[future]
+            error = future.exception()
+            if error is not None:
+                errors[stock] = repr(error)
+            if on_progress is not None:
+                on_progress(n_done, len(stocks), stock, error)
+    return errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='precompute the price forecasts of all stocks in the dataset')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--threads-per-worker', type=int, default=1, help='cpu threads per worker process')
+    parser.add_argument('stocks', nargs='*', help='stocks to forecast (default: all)')
+    args = parser.parse_args()
+    errors = forecast_all(stocks=args.stocks or None, max_workers=args.workers, threads_per_worker=args.threads_per_worker,
+                          on_progress=lambda n_done, n_total, stock, error: print('{}/{} {}: {}'.format(n_done, n_total, stock, 'failed' if error else 'done')))
+    for stock, error in errors.items():
+        print(stock, error)
@@ -0,0 +1,176 @@
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+import argparse
+import tracemalloc
+import numpy as np
+import pandas as pd
+from objective import make_objective
+from utils import MarketStats, normalized_returns, weight_creator, portfolio_returns, portfolio_std, portfolio_sharp_ratio, simulate_portfolios, sim2_df
+
+
+#####################################################
+# Synthetic Data
+#####################################################
+
+def synthetic_prices(n_assets:int, n_days:int, seed:int=0)->pd.DataFrame:
+    """price panel of n_assets correlated geometric brownian motions over n_days business days"""
+    rng = np.random.default_rng(seed)
+    loadings = rng.normal(0, 0.008, (n_assets, 3))
+    daily_returns = rng.normal(0, 0.01, (n_days, 3)) @ loadings.T*10 + rng.normal(0.0003, 0.01, (n_days, n_assets))
+    prices = 100*np.exp(np.cumsum(daily_returns, axis=0))
+    index = pd.bdate_range('2010-01-01', periods=n_days, name='Date')
+    return pd.DataFrame(prices, index=index, columns=['stock_{}'.format(i) for i in range(n_assets)])
+
+
+
+#####################################################
+# Benchmark Stages
+#####################################################
+
+def _legacy_monte_carlo(df_returns:pd.DataFrame, n_experiments:int, rfr:float=0.03):
+    """the per-portfolio simulation loop formerly run by optimize.run_optimize_app"""
+    for _ in range(n_experiments):
+        weights = weight_creator(df_returns)
+        portfolio_return = portfolio_returns(df_returns, weights)
+        portfolio_stdev = portfolio_std(df_returns, weights)
+        portfolio_sharp_ratio(portfolio_return, portfolio_stdev, rfr=rfr)
+
+def _legacy_objective(df_returns:pd.DataFrame, swarm:np.ndarray, rfr:float=0.03, max_risk:float=0.2):
+    """the scalar swarm objective formerly evaluated once per particle"""
+    for x in swarm:
+        x = x/np.sum(x)
+        stdev = portfolio_std(df_returns, x)
+        sr = portfolio_sharp_ratio(portfolio_returns(df_returns, x), stdev, rfr)
+        penalty = 10000*(stdev - max_risk)**2 if (stdev > max_risk or stdev < 0.9*max_risk) else 0
+        -sr + penalty
+
+def make_stages(df:pd.DataFrame, n_experiments:int, n_loop:int, swarmsize:int=100)->dict:
+    """return the benchmark stages for the price panel df as {name: callable}"""
+    df_returns = normalized_returns(df)
+    weights = weight_creator(df_returns)
+    swarm = np.random.default_rng(0).random((swarmsize, len(df.columns)))
+    objective = make_objective(df_returns, rfr=0.03, max_risk=0.2)
+    w, returns, stds, srs = simulate_portfolios(df_returns, n_experiments, rfr=0.03, seed=0)
+    factor_stats = MarketStats(df_returns, estimator='factor model')
+    return {
+        'normalized_returns': lambda: normalized_returns(df),
+        'portfolio_std': lambda: portfolio_std(df_returns, weights),
+        'monte_carlo_loop_{}'.format(n_loop): lambda: _legacy_monte_carlo(df_returns, n_loop),
+        'monte_carlo_batch_{}'.format(n_experiments): lambda: simulate_portfolios(df_returns, n_experiments, rfr=0.03, seed=0),
+        'factor_model_estimate': lambda: MarketStats(df_returns, estimator='factor model'),
+        'monte_carlo_factor_{}'.format(n_experiments): lambda: simulate_portfolios(factor_stats, n_experiments, rfr=0.03, seed=0),
+        'sim2_df_{}'.format(n_experiments): lambda: sim2_df(returns, stds, srs, w, list(df.columns)),
+        'pso_objective_scalar_{}'.format(swarmsize): lambda: _legacy_objective(df_returns, swarm),
+        'pso_objective_batch_{}'.format(swarmsize): lambda: objective(swarm),
+    }
+
+def measure(func, repeats:int=3)->dict:
+    """best wall time of repeats runs and peak traced memory of one extra run"""
+    timings = []
+    for _ in range(repeats):
+        t_start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - t_start)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'seconds': min(timings), 'peak_bytes': peak}
+
+def run_benchmarks(sizes:list, n_experiments:int=10000, n_loop:int=200, repeats:int=3, log=print)->dict:
+    """run all stages for every (n_assets, n_days) size, returns machine-readable results"""
+    results = []
+    for n_assets, n_days in sizes:
+        df = synthetic_prices(n_assets, n_days)
+        for stage, func in make_stages(df, n_experiments, n_loop).items():
+            result = dict(stage=stage, assets=n_assets, days=n_days, **measure(func, repeats))
+            log('{stage:<32} {assets:>5} x {days:<6} {seconds:10.5f} s {peak_bytes:>14,d} B'.format(**result))
+            results.append(result)
+    meta = {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'platform': platform.platform(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    return {'meta': meta, 'results': results}
+
+def compare(results:dict, baseline:dict, tolerance:float=0.2, log=print)->list:
+    """compare results against a baseline, returns the stages slower than (1 + tolerance) times the baseline"""
+    baseline_seconds = {(r['stage'], r['assets'], r['days']): r['seconds'] for r in baseline['results']}
+    regressions = []
+    for r in results['results']:
+        key = (r['stage'], r['assets'], r['days'])
+        if key not in baseline_seconds:
+            continue
+        ratio = r['seconds'] / max(baseline_seconds[key], 1e-12)
+        log('{:<32} {:>5} x {:<6} {:8.2f}x baseline'.format(r['stage'], r['assets'], r['days'], ratio))
+        if ratio > 1 + tolerance:
+            regressions.append(dict(r, ratio=ratio))
+    return regressions
+
+
+
+#####################################################
+# Startup Benchmarks
+#####################################################
+
+# modules imported at startup (app) and on first use of a page or feature
+STARTUP_MODULES = ['app', 'eda', 'optimize', 'utils', 'neuralprophet']
+
+_import_script = '''
+import sys, time, tracemalloc
+if sys.argv[2] == '1':
+    tracemalloc.start()
+t_start = time.perf_counter()
+__import__(sys.argv[1])
+print(time.perf_counter() - t_start, tracemalloc.get_traced_memory()[1])
+'''
+
+def measure_import(module:str, repeats:int=3)->dict:
+    """best wall time of importing module in a fresh interpreter and peak traced memory of one extra import"""
+    def run(trace_memory:bool):
+        output = subprocess.run([sys.executable, '-c', _import_script, module, '1' if trace_memory else '0'], 
+                                cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True).stdout
+        seconds, peak = output.split()[-2:]
+        return float(seconds), int(peak)
+    timings = [run(False)[0] for _ in range(repeats)]
+    return {'seconds': min(timings), 'peak_bytes': run(True)[1]}
+
+def run_startup_benchmarks(modules:list=STARTUP_MODULES, repeats:int=3, log=print)->list:
+    """import time of every module in a fresh interpreter, as results of run_benchmarks without panel size"""
+    results = []
+    for module in modules:
+        try:
+            result = dict(stage='import_' + module, assets=0, days=0, **measure_import(module, repeats))
+        except subprocess.CalledProcessError as error:
+            log('{:<32} failed: {}'.format('import_' + module, (error.stderr.strip().splitlines() or [''])[-1]))
+            continue
+        log('{stage:<32} {assets:>5} x {days:<6} {seconds:10.5f} s {peak_bytes:>14,d} B'.format(**result))
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='benchmark the portfolio and simulation hot paths on synthetic price panels')
+    parser.add_argument('--sizes', nargs='*', default=['8x3000', '40x3000', '100x5000'], help='price panel sizes as ASSETSxDAYS, e.g. 500x10000')
+    parser.add_argument('--n-experiments', type=int, default=10000, help='portfolios of the batch simulation')
+    parser.add_argument('--n-loop', type=int, default=200, help='portfolios of the per-portfolio simulation loop')
+    parser.add_argument('--repeats', type=int, default=3, help='timing repeats per stage (best is reported)')
+    parser.add_argument('--startup', action='store_true', help='also measure the import time of the app and its pages in fresh interpreters')
+    parser.add_argument('--output', default='benchmark_results.json', help='file to write the results to')
+    parser.add_argument('--baseline', default=None, help='results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown relative to the baseline')
+    args = parser.parse_args()
+
+    sizes = [tuple(int(n) for n in size.lower().split('x')) for size in args.sizes]
+    results = run_benchmarks(sizes, n_experiments=args.n_experiments, n_loop=args.n_loop, repeats=args.repeats)
+    if args.startup:
+        results['results'] += run_startup_benchmarks(repeats=args.repeats)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), tolerance=args.tolerance)
+        if regressions:
+            print('{} stage(s) slower than the baseline'.format(len(regressions)))
+            sys.exit(1)
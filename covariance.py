@@ -0,0 +1,165 @@
+import numpy as np
+import pandas as pd
+
+
+#####################################################
+# Covariance Models
+#####################################################
+# A covariance model offers the operations the portfolio functions, the simulator, the swarm objective and
+# the solver need, so a low-rank factor model never has to be expanded to a dense (k, k) matrix:
+#   dot(W)        -> W @ Σ for a (n, k) batch of weights
+#   variances(W)  -> diagonal of W Σ W´, the daily variance of every portfolio
+#   row(j), diag  -> single row and diagonal of Σ
+#   max_eigenvalue() -> (upper bound of) the largest eigenvalue of Σ, used as step size of the solver
+# Plain covariance arrays are wrapped by as_covariance, so all functions accept both.
+
+class DenseCovariance:
+    """Covariance model holding the full (k, k) matrix."""
+
+    def __init__(self, matrix:np.ndarray):
+        self.matrix = np.asarray(matrix, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def dot(self, weights:np.ndarray)->np.ndarray:
+        return weights @ self.matrix
+
+    def variances(self, weights:np.ndarray)->np.ndarray:
+        weights = np.atleast_2d(weights)
+        return np.einsum('ij,ij->i', weights @ self.matrix, weights)
+
+    def row(self, j:int)->np.ndarray:
+        return self.matrix[j]
+
+    @property
+    def diag(self)->np.ndarray:
+        return np.diag(self.matrix)
+
+    def max_eigenvalue(self)->float:
+        return np.linalg.eigvalsh(self.matrix)[-1]
+
+class FactorCovariance:
+    """Low-rank plus diagonal covariance model  Σ = B diag(factor_variances) B´ + diag(residual_variances)
+    with (k, f) factor loadings B. Products and portfolio variances cost O(k·f) per portfolio instead of O(k²)."""
+
+    def __init__(self, loadings:np.ndarray, factor_variances:np.ndarray, residual_variances:np.ndarray):
+        self.loadings = np.asarray(loadings, dtype=np.float64)
+        self.factor_variances = np.asarray(factor_variances, dtype=np.float64)
+        self.residual_variances = np.asarray(residual_variances, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.loadings)
+
+    def dot(self, weights:np.ndarray)->np.ndarray:
+        return ((weights @ self.loadings)*self.factor_variances) @ self.loadings.T + weights*self.residual_variances
+
+    def variances(self, weights:np.ndarray)->np.ndarray:
+        weights = np.atleast_2d(weights)
+        exposures = weights @ self.loadings
+        return (exposures**2) @ self.factor_variances + (weights**2) @ self.residual_variances
+
+    def row(self, j:int)->np.ndarray:
+        row = self.loadings @ (self.factor_variances*self.loadings[j])
+        row[j] += self.residual_variances[j]
+        return row
+
+    @property
+    def diag(self)->np.ndarray:
+        return (self.loadings**2) @ self.factor_variances + self.residual_variances
+
+    @property
+    def matrix(self)->np.ndarray:
+        """dense (k, k) matrix, only for small universes"""
+        return (self.loadings*self.factor_variances) @ self.loadings.T + np.diag(self.residual_variances)
+
+    def max_eigenvalue(self)->float:
+        # the low-rank part has the nonzero eigenvalues of the small (f, f) matrix F½ B´B F½, adding the largest residual bounds Σ´s
+        root = np.sqrt(self.factor_variances)
+        small = root[:, None]*(self.loadings.T @ self.loadings)*root[None, :]
+        return np.linalg.eigvalsh(small)[-1] + np.max(self.residual_variances)
+
+def as_covariance(cov):
+    """wrap a covariance array as DenseCovariance, covariance models are returned unchanged"""
+    if isinstance(cov, (DenseCovariance, FactorCovariance)):
+        return cov
+    return DenseCovariance(cov)
+
+def portfolio_variances(weights:np.ndarray, cov)->np.ndarray:
+    """daily variances of a (n, k) batch of portfolios given a covariance array or model"""
+    return as_covariance(cov).variances(weights)
+
+
+
+#####################################################
+# Portfolio Statistics
+#####################################################
+# The one place computing portfolio KPIs of weight batches, used by the simulator, the swarm objective and the solver.
+
+NTD = 250 #  number of trading days per year
+
+def portfolio_stds(weights:np.ndarray, cov, ntd:int=NTD)->np.ndarray:
+    """annualized standard deviations of a (n, k) batch of portfolios"""
+    return np.sqrt(np.maximum(portfolio_variances(weights, cov), 0))*np.sqrt(ntd)
+
+def batch_portfolio_kpis(weights:np.ndarray, mean:np.ndarray, cov, rfr:float, ntd:int=NTD):
+    """Return, standard deviation and sharp ratio of a (n, k) batch of normalized weights given the mean vector
+    and covariance (array or covariance model) of the daily returns (see utils.portfolio_returns, portfolio_std and portfolio_sharp_ratio)."""
+    returns = weights @ mean
+    stds = portfolio_stds(weights, cov, ntd)
+    return returns, stds, np.divide(returns - rfr/ntd, stds)
+
+
+
+#####################################################
+# Covariance Estimators
+#####################################################
+
+def _centered_returns(df_returns:pd.DataFrame)->np.ndarray:
+    """daily returns minus their mean as array, missing returns count as mean returns"""
+    X = np.asarray(df_returns, dtype=np.float64)
+    X = X - np.nanmean(X, axis=0)
+    return np.nan_to_num(X)
+
+def sample_covariance(df_returns:pd.DataFrame)->DenseCovariance:
+    """sample covariance matrix of the daily returns"""
+    return DenseCovariance(pd.DataFrame(df_returns).cov().values)
+
+def ledoit_wolf_covariance(df_returns:pd.DataFrame)->DenseCovariance:
+    """Sample covariance shrunk towards a scaled identity matrix with the shrinkage intensity of Ledoit and Wolf (2004).
+    Stays well-conditioned when the number of assets approaches the number of days."""
+    X = _centered_returns(df_returns)
+    n, k = X.shape
+    S = X.T @ X / n
+    mu = np.trace(S) / k
+    # distance of the sample covariance to the target and estimation error of the sample covariance
+    delta = np.sum((S - mu*np.eye(k))**2) / k
+    X2 = X**2
+    beta = (np.sum(X2.T @ X2) / n - np.sum(S**2)) / (k*n)
+    shrinkage = 0.0 if delta == 0 else min(beta, delta) / delta
+    return DenseCovariance((1 - shrinkage)*S + shrinkage*mu*np.eye(k))
+
+def factor_covariance(df_returns:pd.DataFrame, n_factors:int=10)->FactorCovariance:
+    """Statistical factor model: the n_factors principal components of the daily returns as factors
+    plus uncorrelated residuals, keeping the sample variance of every single asset."""
+    X = _centered_returns(df_returns)
+    n, k = X.shape
+    n_factors = max(min(n_factors, k - 1, n - 1), 1)
+    _, s, Vt = np.linalg.svd(X, full_matrices=False)
+    loadings = Vt[:n_factors].T
+    factor_variances = s[:n_factors]**2 / (n - 1)
+    total_variances = np.sum(X**2, axis=0) / (n - 1)
+    residual_variances = np.maximum(total_variances - (loadings**2) @ factor_variances, 1e-12)
+    return FactorCovariance(loadings, factor_variances, residual_variances)
+
+ESTIMATORS = {
+    'sample': sample_covariance,
+    'ledoit-wolf': ledoit_wolf_covariance,
+    'factor model': factor_covariance,
+}
+
+def estimate_covariance(df_returns:pd.DataFrame, estimator:str='sample', **kwargs):
+    """covariance model of the daily returns with one of the ESTIMATORS"""
+    if estimator not in ESTIMATORS:
+        raise ValueError('unknown covariance estimator {}, choose one of {}'.format(estimator, list(ESTIMATORS)))
+    return ESTIMATORS[estimator](df_returns, **kwargs)
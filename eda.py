@@ -2,13 +2,18 @@ import streamlit as st
 import os
 from pathlib import Path
 from datetime import datetime
-import numpy as np
-import pandas as pd
 from datetime import datetime
-import yfinance as yf
 import plotly.express as px
 import plotly.graph_objects as go
-from utils import normalized_returns, find_stock_name, make_forecast
+from assets import dax_assets, mixed_assets, tech_assets, alexa_assets, asset_classes
+from batch_forecast import forecast_all
+from forecast_store import ForecastCache
+from perf import stage
+from pipeline import download_prices
+from price_cache import PriceCache, YahooFetcher
+from storage import load_frame, save_frame
+from utils import load_market_stats, make_forecast
+from workspace import DatasetStore, session_dataset
 
 
 # set directories
@@ -17,85 +22,8 @@ DATAPATH = Path(rootdir) / 'data'
 MODELPATH = Path(rootdir) / 'models'
 Path(DATAPATH).mkdir(parents=True, exist_ok=True)
 Path(MODELPATH).mkdir(parents=True, exist_ok=True)
-
-# mapping for top 40 dax companies 
-dax_assets = {
-               'DAX': '^GDAXI',
-               'Linde': 'LIN',
-               'SAP': 'SAP',
-               'Deutsche Telekom': 'DTE.DE',
-               'Volkswagen': 'VOW3.DE',
-               'Siemens': 'SIE.DE',
-               'Merck': 'MRK.DE',
-               'Airbus': 'AIR.PA',
-               'Mercedes Benz': 'MBG.DE', 
-               'Bayer': 'BAYZF',
-               'BMW': 'BMW.DE',
-               'Siemens Healthineers': 'SHL.DE',
-               'Deutsche Post': 'DPW.DE',
-               'BASF': 'BAS.DE',
-               'Münchner Rück': 'MUV2.DE',
-               'Infineon': 'IFX.DE',
-               'Deutsche Börse': 'DB1:DE',
-               'RWE': 'RWE.DE',
-               'Henkel': 'HEN3.DE',
-               'Adidas': 'ADS.DE',
-               'Sartorius': 'SRT.DE',
-               'Beiersdorf': 'BEI.DE',
-               'Porsche': 'PAH3.DE',
-               'E.ON': 'EOAN.DE',
-               'Deutsche Bank': 'DB',
-               'Vonovia': 'VNA.DE',
-               'Fresenius': 'FRE.DE',
-               'Symrise': 'SY1.DE',
-               'Continental': 'CON.DE',
-               'Delivery Hero': 'DHER.F',
-               'Brenntag': 'BNR.DE',
-               'Qiagen': 'QGEN',
-               'Fresenius Medical Care': 'FMS',
-               'Siemens Energy': 'ENR.F',
-               'HeidelbergCement': 'HEI.DE',
-               'Puma': 'PUM.DE',
-               'MTU Aero Engines': 'MTX.DE',
-               'Covestro': '1COV.F',
-               'Zalando': 'ZAL.DE',
-               'HelloFresh': 'HFG.DE'
-            }
-
-mixed_assets = {
-               'DAX': '^GDAXI',
-               'Eurostoxx': '^STOXX50E',
-               'DowJones': '^DJI',
-               'Nikkei': '^N225',
-               'SP500': '^GSPC',
-               'GOLD': 'GC=F',
-               'Silver': 'SI=F',
-               'Bitcoin': 'BTC-EUR',
-                }
-
-tech_assets = {
-               'Microsoft': 'MSFT',
-               'Tesla': 'TSLA',
-               'Google': 'GOOG',
-               'Apple': 'AAPL',
-               'IBM': 'IBM',
-               'Amazon': 'AMZN',
-               'Samsung': 'SSUN.F',
-               'Intel': 'INTC',
-                }
-
-alexa_assets = {
-                'Abbott_Laboratories': 'ABT',
-                'Allianz_SE': 'ALV.DE',
-                'Google': 'GOOG',
-                'Coca_Cola': 'KO',
-                'Colgate_Palmolive': 'CL',
-                'HDFC_Bank': 'HDB',
-                'Internat_Flavors': 'IFF',
-                'Medtronic': 'MDT',
-                'Mondelez': 'MDLZ',
-                'Thermo_Fisher': 'TMO'
-               }
+# immutable dataset versions shared by all sessions, every session references its own version
+store = DatasetStore()
 
 
 def run_eda_app():
@@ -132,44 +60,44 @@ def run_eda_app():
     ########################################
     if st.button('Download Stock-Data'):
         data_load_state = st.text('Loading data from yahoo finance api ...')
-        # download stocks
-        df = yf.download(selected_stock_tickers, 
-                         start=start_date_selected, 
-                         end=end_date_selected, 
-                         progress=True)
+        progress_bar = st.progress(0)
+        def show_progress(n_done, n_total, ticker, error):
+            status = 'failed' if error is not None else 'done'
+            data_load_state.text('Loading data from yahoo finance api ... {}/{} ({}: {})'.format(n_done, n_total, ticker, status))
+            progress_bar.progress(n_done / n_total)
+        # download stocks concurrently, only date ranges missing in the local price cache are requested,
+        # name the stocks, drop stocks with too many missing values and fill missing data
+        price_cache = PriceCache(DATAPATH / 'prices', YahooFetcher())
+        df, fetch_report = download_prices(selected_stock_tickers, 
+                                           start=start_date_selected, 
+                                           end=end_date_selected,
+                                           price_cache=price_cache,
+                                           asset_mapping=asset_classes[selected_asset_class],
+                                           na_percentage=0.6,
+                                           on_progress=show_progress)
         data_load_state.text('Loading data from yahoo finance api ...done!')
-        # drop columns
-        df = df['Close']
-        # get actual stock names
         st.write(selected_asset_class)
-        if selected_asset_class == 'dax top 40':
-            stock_names = [find_stock_name(dax_assets, stock_ticker) for stock_ticker in df.columns]
-        elif selected_asset_class == 'mixed assets':
-            stock_names = [find_stock_name(mixed_assets, stock_ticker) for stock_ticker in df.columns]
-        elif selected_asset_class == 'tech assets':
-            stock_names = [find_stock_name(tech_assets, stock_ticker) for stock_ticker in df.columns]
-        elif selected_asset_class == 'alexa assets':
-            stock_names = [find_stock_name(alexa_assets, stock_ticker) for stock_ticker in df.columns]
-        # rename columns
-        df.columns = stock_names
-        # make sure the index is datetime format
-        df.index = pd.to_datetime(df.index)
-        # drop nas
-        na_percentage = 0.6 # at least x percent rows must be none-nas
-        datetimeFormat = '%Y-%m-%d'
-        time_delta = datetime.strptime(end_date_selected, datetimeFormat) - datetime.strptime(start_date_selected,datetimeFormat)
-        df.dropna(axis=1, thresh=int(time_delta.days * na_percentage), inplace=True)
-        # fill missing data
-        df = df.interpolate(method='time', limit=7).fillna(value=None, method='bfill', axis=0, inplace=False, limit=7, downcast=None)
-        df.to_csv(DATAPATH / 'data.csv') # save dataset to local folder
+        # report failed, partially downloaded and dropped stocks
+        if fetch_report.failed:
+            st.warning('failed to download: ' + ', '.join(fetch_report.failed.keys()))
+        if fetch_report.partial:
+            st.warning('some dates failed to download for: ' + ', '.join(fetch_report.partial.keys()))
+        if fetch_report.dropped:
+            st.warning('dropped for too many missing values: ' + ', '.join(fetch_report.dropped))
+        # save dataset as new version of the session´s workspace (identical datasets are stored once)
+        st.session_state['dataset_version'] = store.commit(lambda path: save_frame(df, path / 'data'))
         # show data
         st.write(df)
 
     ########################################
     # plot
     ######################################## 
-    df = pd.read_csv(DATAPATH / 'data.csv', index_col='Date')
-    df.index = pd.to_datetime(df.index)
+    dataset_version = session_dataset(st.session_state, store)
+    if dataset_version is None:
+        st.info('no stock data yet, download it first')
+        return
+    datapath = store.path(dataset_version)
+    df = load_frame(datapath / 'data')
     
     stock = st.selectbox(label='select stock to visualize', options=df.columns)
     kind = st.selectbox(label='select price or daily returns', options=['price', 'price forecast', 'daily returns'])
@@ -178,15 +106,27 @@ def run_eda_app():
                       y=stock,
                       labels={stock: 'price'}, 
                       title=stock + ': Stock Price')
-        st.plotly_chart(fig)
+        with stage('render price chart'):
+            st.plotly_chart(fig)
     elif kind == 'daily returns':
-        fig = px.line(normalized_returns(df), 
+        fig = px.line(load_market_stats(datapath / 'data').df_returns, 
                       y=stock,
                       labels={stock: 'daily returns [%]'}, 
                       title=stock + ': Daily Returns Percentages')
-        st.plotly_chart(fig)
+        with stage('render returns chart'):
+            st.plotly_chart(fig)
     elif kind == 'price forecast':
-        forecast = make_forecast(df, stock)
+        if st.button('Precompute Forecasts for all Stocks'):
+            forecast_state = st.text('training forecast models ...')
+            progress_bar = st.progress(0)
+            def show_progress(n_done, n_total, stock_done, error):
+                forecast_state.text('training forecast models ... {}/{} ({}: {})'.format(n_done, n_total, stock_done, 'failed' if error else 'done'))
+                progress_bar.progress(n_done / n_total)
+            errors = forecast_all(datapath, MODELPATH, on_progress=show_progress)
+            if errors:
+                st.warning('forecast failed for: ' + ', '.join(errors.keys()))
+        # precomputed forecasts are taken from the forecast store
+        forecast = make_forecast(df, stock, cache=ForecastCache(MODELPATH))
  
         # plot the data
         st.write('Price and One Year Forecast for: '+stock)
@@ -197,7 +137,8 @@ def run_eda_app():
         fig = fig.add_trace(go.Line(x = forecast['ds'],
                                     y = forecast['yhat1'], 
                                     name = 'forecast'))       
-        st.plotly_chart(fig)
+        with stage('render forecast chart'):
+            st.plotly_chart(fig)
         # plot components
         st.write('Trend for: '+stock)
         fig = go.Figure()
@@ -205,7 +146,8 @@ def run_eda_app():
                                     y = forecast['trend'], 
                                     name = 'trend', 
                                     line=dict(color='black', width=4)))       
-        st.plotly_chart(fig)        
+        with stage('render trend chart'):
+            st.plotly_chart(fig)
         
 
 
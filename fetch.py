@@ -0,0 +1,115 @@
+import time
+import random
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pandas as pd
+from price_cache import LocalFetcher, PartialFetchError
+
+
+#####################################################
+# Fetch Report
+#####################################################
+
+@dataclass
+class FetchReport:
+    """Outcome of a multi-ticker download: fetched tickers, failed tickers with their last error,
+    fetched tickers with date ranges still missing after all retries (partial) with their last error,
+    tickers dropped for too many missing values and the number of attempts per ticker."""
+    fetched: list = field(default_factory=list)
+    failed: dict = field(default_factory=dict)
+    partial: dict = field(default_factory=dict)
+    dropped: list = field(default_factory=list)
+    attempts: dict = field(default_factory=dict)
+
+    @property
+    def ok(self)->bool:
+        return not self.failed and not self.partial and not self.dropped
+
+
+
+#####################################################
+# Concurrent Fetching
+#####################################################
+
+def _get_with_retries(price_cache, ticker:str, start, end, retries:int, backoff:float):
+    """Get the prices of one ticker, retrying with exponential backoff (only the gaps still missing are fetched again).
+    Returns the series, the number of attempts and the error of the gaps still missing after the last attempt (None if complete)."""
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            series = price_cache.get(ticker, start, end)
+            if len(series) == 0:
+                raise ValueError('no data returned for ' + ticker)
+            return series, attempt, None
+        except Exception as e:
+            if attempt > retries:
+                # keep the prices fetched so far if only some gaps failed
+                if isinstance(e, PartialFetchError) and len(e.series) > 0:
+                    return e.series, attempt, e
+                e.attempts = attempt
+                raise
+            time.sleep(backoff * 2**(attempt - 1))
+
+def fetch_prices(tickers:list, start, end, price_cache, max_workers:int=8, retries:int=2, backoff:float=0.5, on_progress=None):
+    """Download the close prices of all tickers with a bounded thread pool.
+    Failed tickers are retried with exponential backoff, on_progress(n_done, n_total, ticker, error) is called from the
+    calling thread after each ticker. Tickers of which only some date ranges failed are kept and reported as partial.
+    Returns the wide close price frame of the successful tickers and a FetchReport."""
+    report = FetchReport()
+    prices = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tickers)))) as pool:
+        futures = {pool.submit(_get_with_retries, price_cache, ticker, start, end, retries, backoff): ticker for ticker in tickers}
+        for n_done, future in enumerate(as_completed(futures), start=1):
+            ticker = futures[future]
+            error = None
+            try:
+                prices[ticker], report.attempts[ticker], error = future.result()
+                if error is not None:
+                    report.partial[ticker] = repr(error)
+            except Exception as e:
+                error = e
+                report.failed[ticker] = repr(e)
+                report.attempts[ticker] = getattr(e, 'attempts', retries + 1)
+            if on_progress is not None:
+                on_progress(n_done, len(tickers), ticker, error)
+    # keep the order of the requested tickers
+    report.fetched = [ticker for ticker in tickers if ticker in prices]
+    if not report.fetched:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name='Date')), report
+    df = pd.concat([prices[ticker] for ticker in report.fetched], axis=1)
+    df.columns = report.fetched
+    df.index.name = 'Date'
+    return df, report
+
+def drop_sparse_columns(df:pd.DataFrame, start, end, na_percentage:float=0.6, report:FetchReport=None)->pd.DataFrame:
+    """Drop columns with less than na_percentage non-na rows per calendar day of the date range.
+    Dropped columns are recorded in the report if one is given."""
+    time_delta = pd.Timestamp(end) - pd.Timestamp(start)
+    df_kept = df.dropna(axis=1, thresh=int(time_delta.days * na_percentage))
+    if report is not None:
+        report.dropped += [col for col in df.columns if col not in df_kept.columns]
+    return df_kept
+
+
+
+#####################################################
+# Stub Fetcher
+#####################################################
+
+class StubFetcher(LocalFetcher):
+    """Local fetcher injecting latency and failures to exercise the fetch subsystem offline.
+    Tickers in failing_tickers always fail, the others fail randomly with probability failure_rate."""
+
+    def __init__(self, df:pd.DataFrame, latency:float=0.0, failure_rate:float=0.0, failing_tickers=(), seed=None):
+        super().__init__(df)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failing_tickers = set(failing_tickers)
+        self._random = random.Random(seed)
+
+    def fetch(self, ticker:str, start:pd.Timestamp, end:pd.Timestamp)->pd.Series:
+        time.sleep(self.latency)
+        if ticker in self.failing_tickers or self._random.random() < self.failure_rate:
+            raise ConnectionError('injected failure fetching ' + ticker)
+        return super().fetch(ticker, start, end)
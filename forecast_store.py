@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import uuid
+import zlib
+import fcntl
+import inspect
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import quote
+import numpy as np
+import pandas as pd
+
+
+#####################################################
+# Forecast Cache
+#####################################################
+
+logger = logging.getLogger('forecast_store')
+
+# most recently used entries loaded in this process, keyed by cache directory and entry key, see ForecastCache.preload
+MAX_LOADED_ENTRIES = 32
+_loaded_entries = OrderedDict()
+_loaded_lock = threading.Lock()
+
+def _load_model(path):
+    """load a pickled model, torch >= 2.6 only loads plain weights unless weights_only=False is passed"""
+    import torch
+    if 'weights_only' in inspect.signature(torch.load).parameters:
+        return torch.load(path, weights_only=False)
+    return torch.load(path)
+
+def series_fingerprint(series:pd.Series)->dict:
+    """cheap fingerprint of a price series: length, last date and a crc32 checksum of dates and values"""
+    values = np.ascontiguousarray(series.values, dtype=np.float64)
+    dates = np.ascontiguousarray(pd.DatetimeIndex(series.index).values.astype('datetime64[ns]').view(np.int64))
+    checksum = zlib.crc32(values.tobytes(), zlib.crc32(dates.tobytes()))
+    last_date = pd.Timestamp(series.index[-1]).strftime('%Y-%m-%d') if len(series) else ''
+    return {'length': len(series), 'last_date': last_date, 'checksum': checksum}
+
+class ForecastCache:
+    """Persistent cache of fitted forecast models and their forecast frames, keyed by ticker and series fingerprint.
+    Entries are evicted least recently used first once the cache grows beyond max_bytes.
+    The index is updated under a file lock, so several processes can share the cache.
+    The most recently used entries are also kept in memory, the returned models and forecasts are shared
+    and must not be modified in place (get_prefix returns private copies for fine-tuning)."""
+
+    def __init__(self, cachedir, max_bytes:int=500*1024**2):
+        self.cachedir = Path(cachedir)
+        self.cachedir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._index_path = self.cachedir / 'forecast_index.json'
+
+    @contextmanager
+    def _locked(self):
+        """hold an exclusive lock on the cache index across processes"""
+        with open(self.cachedir / 'forecast_index.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_index(self)->dict:
+        if not self._index_path.exists():
+            return {}
+        with open(self._index_path) as f:
+            return json.load(f)
+
+    def _write_index(self, index:dict):
+        tmp_path = self._index_path.with_name(self._index_path.name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self._index_path)
+
+    @staticmethod
+    def key(ticker:str, fingerprint:dict)->str:
+        return '{}-{}-{}-{:08x}'.format(quote(ticker, safe=''), fingerprint['length'], fingerprint['last_date'], fingerprint['checksum'])
+
+    def _paths(self, key:str):
+        return self.cachedir / (key + '.model.pt'), self.cachedir / (key + '.forecast.pkl')
+
+    def _forget(self, key:str):
+        """remove an entry from the memory of this process"""
+        with _loaded_lock:
+            _loaded_entries.pop((str(self.cachedir), key), None)
+
+    def _read_entry(self, key:str, shared:bool=True):
+        """model and forecast of an entry, shared entries are taken from and kept in the memory of this process"""
+        memory_key = (str(self.cachedir), key)
+        if shared:
+            with _loaded_lock:
+                if memory_key in _loaded_entries:
+                    _loaded_entries.move_to_end(memory_key)
+                    return _loaded_entries[memory_key]
+        model_path, forecast_path = self._paths(key)
+        entry = (_load_model(model_path), pd.read_pickle(forecast_path))
+        if shared:
+            with _loaded_lock:
+                _loaded_entries[memory_key] = entry
+                while len(_loaded_entries) > MAX_LOADED_ENTRIES:
+                    _loaded_entries.popitem(last=False)
+        return entry
+
+    def _drop(self, key:str):
+        """remove an entry from the index and delete its files"""
+        self._forget(key)
+        with self._locked():
+            index = self._read_index()
+            index.pop(key, None)
+            self._write_index(index)
+            for path in self._paths(key):
+                if path.exists():
+                    path.unlink()
+
+    def _load(self, index:dict, key:str, shared:bool=True):
+        """Load the model and forecast of an entry and mark it as recently used.
+        Entries which cannot be loaded (files gone, corrupt or written by incompatible versions) are dropped, returns None then."""
+        try:
+            model, forecast = self._read_entry(key, shared=shared)
+        except Exception as e:
+            logger.warning('dropping unreadable forecast cache entry {}: {!r}'.format(key, e))
+            self._drop(key)
+            return None
+        with self._locked():
+            index = self._read_index()
+            if key in index:
+                index[key]['last_access'] = time.time()
+                self._write_index(index)
+        return model, forecast
+
+    def has(self, ticker:str, series:pd.Series)->bool:
+        """whether an entry for ticker and this exact series exists, without loading it"""
+        key = self.key(ticker, series_fingerprint(series))
+        return key in self._read_index() and all(path.exists() for path in self._paths(key))
+
+    def get(self, ticker:str, series:pd.Series):
+        """Return the (model, forecast) stored for ticker and this exact series, None if there is none."""
+        key = self.key(ticker, series_fingerprint(series))
+        index = self._read_index()
+        if key not in index:
+            return None
+        return self._load(index, key)
+
+    def get_prefix(self, ticker:str, series:pd.Series):
+        """Return (model, forecast, length) of the longest entry for ticker fitted on a strict prefix of series,
+        i.e. series only appends new days to the fitted one. None if there is no such entry."""
+        index = self._read_index()
+        candidates = sorted(((entry['length'], key) for key, entry in index.items() 
+                             if entry['ticker'] == ticker and 0 < entry['length'] < len(series)), reverse=True)
+        for length, key in candidates:
+            if self.key(ticker, series_fingerprint(series.iloc[:length])) == key:
+                loaded = self._load(index, key, shared=False)
+                if loaded is not None:
+                    return loaded[0], loaded[1], length
+        return None
+
+    def put(self, ticker:str, series:pd.Series, model, forecast:pd.DataFrame):
+        """Store the fitted model and its forecast for ticker and series, evicting old entries if needed."""
+        import torch
+        fingerprint = series_fingerprint(series)
+        key = self.key(ticker, fingerprint)
+        model_path, forecast_path = self._paths(key)
+        # write to unique temporary files first, so readers never load half-written entries
+        tmp_suffix = '.' + uuid.uuid4().hex + '.tmp'
+        torch.save(model, model_path.with_name(model_path.name + tmp_suffix))
+        forecast.to_pickle(forecast_path.with_name(forecast_path.name + tmp_suffix))
+        os.replace(model_path.with_name(model_path.name + tmp_suffix), model_path)
+        os.replace(forecast_path.with_name(forecast_path.name + tmp_suffix), forecast_path)
+        self._forget(key)
+        with self._locked():
+            index = self._read_index()
+            index[key] = dict(fingerprint, ticker=ticker, last_access=time.time(),
+                              size=model_path.stat().st_size + forecast_path.stat().st_size)
+            self._evict(index)
+            self._write_index(index)
+
+    def preload(self, n_entries:int=10)->int:
+        """Load the n_entries most recently used entries into memory, returns the number of loaded entries."""
+        index = self._read_index()
+        n_loaded = 0
+        for key in sorted(index, key=lambda key: index[key]['last_access'], reverse=True)[:n_entries]:
+            try:
+                self._read_entry(key)
+                n_loaded += 1
+            except Exception as e:
+                logger.warning('cannot preload forecast cache entry {}: {!r}'.format(key, e))
+        return n_loaded
+
+    def _evict(self, index:dict):
+        """drop least recently used entries until the cache fits into max_bytes (the newest entry is always kept)"""
+        total = sum(entry['size'] for entry in index.values())
+        for key in sorted(index, key=lambda key: index[key]['last_access'])[:-1]:
+            if total <= self.max_bytes:
+                break
+            total -= index.pop(key)['size']
+            self._forget(key)
+            for path in self._paths(key):
+                if path.exists():
+                    path.unlink()
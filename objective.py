@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+from covariance import NTD, batch_portfolio_kpis
+from utils import mean_cov, trading_days
+
+
+#####################################################
+# Portfolio Objective Functions
+#####################################################
+
+def normalize_weights(weights:np.ndarray)->np.ndarray:
+    """normalize a (n, k) batch of non-negative weights so every row sums up to one"""
+    weights = np.atleast_2d(weights)
+    return weights / np.maximum(weights.sum(axis=1, keepdims=True), 1e-12)
+
+def risk_band_penalty(stds:np.ndarray, max_risk:float, lower:float=0.9, scale:float=10000)->np.ndarray:
+    """Quadratic penalty for standard deviations above max_risk or below lower*max_risk, zero within the band."""
+    outside = (stds > max_risk) | (stds < lower*max_risk)
+    return np.where(outside, scale*(stds - max_risk)**2, 0.0)
+
+def penalized_sharp_ratio(weights:np.ndarray, mean:np.ndarray, cov, rfr:float, max_risk:float, ntd:int=NTD)->np.ndarray:
+    """Objective to minimize: negative sharp ratio plus the risk band penalty, for a (n, k) batch of (unnormalized) weights."""
+    returns, stds, srs = batch_portfolio_kpis(normalize_weights(weights), mean, cov, rfr, ntd)
+    return -srs + risk_band_penalty(stds, max_risk)
+
+def make_objective(df_returns:pd.DataFrame, rfr:float, max_risk:float):
+    """Make the batched swarm objective for df_returns (dataframe or MarketStats). Mean vector and covariance are computed once."""
+    mean, cov = mean_cov(df_returns)
+    ntd = trading_days(df_returns)
+    def objective(weights:np.ndarray)->np.ndarray:
+        return penalized_sharp_ratio(weights, mean, cov, rfr, max_risk, ntd)
+    return objective
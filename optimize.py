@@ -1,12 +1,18 @@
 import streamlit as st
 import os
+import time
 from pathlib import Path
 import numpy as np
 import pandas as pd
 import plotly.express as px
-from pyswarm import pso
-from utils import normalized_returns, weight_creator, portfolio_returns, portfolio_std, portfolio_sharp_ratio, sim2_df, min_variance_portfolio
-
+from backtest import strategies, walk_forward, backtest_report
+from covariance import ESTIMATORS
+from perf import stage
+from plotting import simulation_scatter
+from pipeline import stream_simulation, run_frontier, run_swarm, save_simulation, load_simulation, save_swarm_weights, load_swarm_weights
+from solver import max_return_under_risk, max_sharp_ratio
+from utils import load_market_stats, portfolio_returns, portfolio_std, portfolio_sharp_ratio
+from workspace import DatasetStore, session_dataset, session_simulation, set_session_simulation, simulation_key, swarm_key
 
 # set directories
 rootdir = os.getcwd()
@@ -14,85 +20,141 @@ DATAPATH = Path(rootdir) / 'data'
 MODELPATH = Path(rootdir) / 'models'
 Path(DATAPATH).mkdir(parents=True, exist_ok=True)
 Path(MODELPATH).mkdir(parents=True, exist_ok=True)
+# immutable dataset and simulation versions shared by all sessions, every session references its own versions
+store = DatasetStore()
+
+
+def progress_figure(results, max_points:int=5000):
+    """scatter plot of (a stratified sample of) the portfolios simulated so far"""
+    return simulation_scatter(results.stds, results.returns, results.sharp_ratios, max_points=max_points,
+                              title='Simulated Portfolios so far')
 
 
 def run_optimize_app():
-    # import data
-    df = pd.read_csv(DATAPATH / 'data.csv', index_col='Date')
-    df.index = pd.to_datetime(df.index)
-                    
     ########################################
     # run monte-carlo experiment
     ########################################
     investment_sum = st.slider(label='select investment sum [€]', min_value=0, max_value=10000, value=100, step=100)
     risk_free_rate = st.slider(label='select risk free interest rate in percent', min_value=-2.0, max_value=10.0, value=3.0, step=0.5)
-    n_experiments = st.slider(label='select number of Monte-Carlo simulationss', min_value=1000, max_value=10000, value=1000, step=1000)
+    optimization_mode = st.radio(label='select optimization mode', options=['Monte-Carlo Simulation', 'Exact Mean-Variance Solver'])
+
+    # shrinkage and factor models stay well-conditioned for large universes, the factor model also scales linearly in the number of stocks
+    covariance_estimator = st.selectbox(label='select covariance estimator', options=list(ESTIMATORS.keys()))
+
+    dataset_version = session_dataset(st.session_state, store)
+    if dataset_version is None:
+        st.info('no stock data yet, download it on the Data Exploration page first')
+        return
+    # normalized daily returns with their mean and covariance, computed once per dataset version and estimator
+    market_stats = load_market_stats(store.path(dataset_version) / 'data', estimator=covariance_estimator)
+
+    if optimization_mode == 'Monte-Carlo Simulation':
+        n_experiments = st.select_slider(label='select number of Monte-Carlo simulationss', options=[1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000, 1000000], value=1000)
+    else:
+        n_frontier_points = st.slider(label='select number of efficient frontier points', min_value=10, max_value=500, value=100, step=10)
     
-    if st.button('Run Monte-Carlo Simulation'):
-        sim_state = st.text('running simulations ...')
-        w = []
-        returns = []
-        stds = []
-        srs = []
-
-        # caclulate normalized daily returns 
-        df_returns = normalized_returns(df)
-
-        for _ in range(n_experiments):
-            weights = weight_creator(df_returns)
-            portfolio_return = portfolio_returns(df_returns, weights)
-            portfolio_stdev = portfolio_std(df_returns, weights) 
-            portfolio_sr = portfolio_sharp_ratio(portfolio_return, portfolio_stdev, rfr=risk_free_rate/100)
-            w.append(weights)
-            returns.append(portfolio_return)
-            stds.append(portfolio_stdev)
-            srs.append(portfolio_sr)
+    # a simulation interrupted by the stop button (or any other rerun) keeps its partial results
+    if 'partial_simulation' in st.session_state:
+        partial_dataset_version, partial_estimator, results = st.session_state.pop('partial_simulation')
+        if len(results) > 0:
+            set_session_simulation(st.session_state, partial_dataset_version, partial_estimator, 'monte-carlo',
+                                   store.commit(lambda path: save_simulation(results, path)))
+            st.info('simulation stopped, keeping the first {} portfolios'.format(len(results)))
+
+    if optimization_mode == 'Monte-Carlo Simulation' and st.button('Run Monte-Carlo Simulation'):
+        # identical simulations are shared across sessions and computed only once
+        key = simulation_key(dataset_version, covariance_estimator, 'monte-carlo', n_experiments, risk_free_rate/100)
+        simulation_version = store.lookup(key)
+        if simulation_version is not None:
+            set_session_simulation(st.session_state, dataset_version, covariance_estimator, 'monte-carlo', simulation_version)
+            sim_state = st.text('identical simulation found ...done!')
+        else:
+            sim_state = st.text('running simulations ...')
+            st.button('Stop Simulation')
+            progress_bar = st.progress(0)
+            best_state = st.empty()
+            chart = st.empty()
+
+            # simulate portfolios chunk-wise, showing the progress and the cloud of portfolios after every chunk
+            chunk_size = min(max(n_experiments // 100, 1000), 20000)
+            t_chart = 0
+            # timed as a whole, including the progress updates between the chunks
+            with stage('monte-carlo simulation'):
+                for results in stream_simulation(market_stats, n_experiments, rfr=risk_free_rate/100, chunk_size=chunk_size):
+                    st.session_state['partial_simulation'] = (dataset_version, covariance_estimator, results)
+                    progress_bar.progress(len(results) / n_experiments)
+                    i_best = np.argmax(results.sharp_ratios)
+                    best_state.text('{} portfolios simulated, best sharp ratio so far: {:.2f} (return {:.3f}%, risk {:.3f})'.format(
+                        len(results), results.sharp_ratios[i_best]*100, results.returns[i_best]*100, results.stds[i_best]))
+                    # redraw the chart at most once per second
+                    if time.perf_counter() - t_chart > 1:
+                        chart.plotly_chart(progress_figure(results))
+                        t_chart = time.perf_counter()
+            del st.session_state['partial_simulation']
         
-        # save simulation results in dataframe
-        stock_names = list(df.columns)
-        df_simulation = sim2_df(returns, stds, srs, w, stock_names)
-        df_simulation.to_csv(DATAPATH / 'simulation.csv') # save dataset to local folder
+            # save simulation results in dataframe
+            simulation_version = store.commit(lambda path: save_simulation(results, path))
+            store.set_ref(key, simulation_version)
+            set_session_simulation(st.session_state, dataset_version, covariance_estimator, 'monte-carlo', simulation_version)
+        
+            sim_state = st.text('running simulations ...done!')
+
+    if optimization_mode == 'Exact Mean-Variance Solver' and st.button('Compute Efficient Frontier'):
+        sim_state = st.text('solving mean-variance problems ...')
+
+        # the frontier portfolios take the place of the simulated portfolios, identical frontiers are computed only once
+        key = simulation_key(dataset_version, covariance_estimator, 'exact', n_frontier_points, risk_free_rate/100)
+        simulation_version = store.get_or_commit(key, 
+                                                 lambda path: save_simulation(run_frontier(market_stats, n_frontier_points, rfr=risk_free_rate/100), path))
+        set_session_simulation(st.session_state, dataset_version, covariance_estimator, 'exact', simulation_version)
         
-        sim_state = st.text('running simulations ...done!')
+        sim_state = st.text('solving mean-variance problems ...done!')
 
 
     #############################################
     # find optimal portfolio for given risk
     #############################################
     
-    # import simulated data
-    df_simulation = pd.read_csv(DATAPATH / 'simulation.csv', index_col=0)
+    # import simulated data of the selected estimator and mode, without a simulation of its own
+    # the session starts with the one precomputed by the batch pipeline
+    mode = 'exact' if optimization_mode == 'Exact Mean-Variance Solver' else 'monte-carlo'
+    simulation_version = session_simulation(st.session_state, store, dataset_version, covariance_estimator, mode)
+    if simulation_version is None:
+        st.info('no portfolios yet, run the simulation or compute the efficient frontier first')
+        return
+    df_simulation, frontier = load_simulation(store.path(simulation_version))
     stock_names = df_simulation.columns[:-3]
-    min_risk = df_simulation['portfolio standard dev'].min()
-    max_risk = df_simulation['portfolio standard dev'].max()
+    min_risk = frontier.stds[0]
+    max_risk = frontier.stds[-1]
     selected_maximal_risk = st.slider(label='select maximal risk', 
                                     min_value=int(min_risk*1000)+1, 
                                     max_value=int(max_risk*1000),
                                     step=1
                                     )
     selected_maximal_risk = selected_maximal_risk/1000
+    # large simulations are plotted as a stratified sample or as density, together with the exact frontier
+    chart_mode = st.selectbox(label='select chart rendering', options=['sampled', 'density', 'all points'])
+    sim_stds = df_simulation['portfolio standard dev'].values
+    sim_returns = df_simulation['portfolio return'].values
+    sim_sharp_ratios = df_simulation['portfolio sharp ratio'].values
 
-    # define risk bounds i.e. maximal acceptable risk
-    risk_bounds = (0, selected_maximal_risk)
-    risk_indices = df_simulation['portfolio standard dev'].between(risk_bounds[0], risk_bounds[1])
-    # find optimal weights
-    weights_opt = df_simulation[risk_indices].sort_values(by='portfolio return', ascending=False)[stock_names].iloc[0,:].values
+    # find optimal weights i.e. maximal return for maximal acceptable risk
+    if optimization_mode == 'Exact Mean-Variance Solver':
+        with stage('risk cap solver'):
+            w, _ = max_return_under_risk(market_stats.mean, market_stats.cov, selected_maximal_risk, ntd=market_stats.ntd)
+        weights_opt = w[0]
+    else:
+        with stage('risk cap query'):
+            weights_opt = df_simulation.iloc[frontier.best_under(selected_maximal_risk)][stock_names].values
     df_opt = pd.DataFrame(data=weights_opt*investment_sum, index=stock_names, columns=['Investment [€]']).T
     #####################################
     # testing the optimal weights!
     #####################################
-    # import data
-    df = pd.read_csv(DATAPATH / 'data.csv', index_col='Date')
-    df.index = pd.to_datetime(df.index)
-    df_returns = normalized_returns(df)
-    sdev = portfolio_std(df_returns, weights_opt)
-    returns = portfolio_returns(df_returns, weights_opt)
-
-    fig = px.scatter(x=df_simulation['portfolio standard dev'], 
-                    y=df_simulation['portfolio return']*100,
-                    color=df_simulation['portfolio sharp ratio']*100,
-                    labels={'y': 'return [%]', 'x': 'standard deviation', 'color': 'sharp ratio'}, 
-                    title='Optimized Portfolio with Maximized Return for Given Risk')
+    sdev = portfolio_std(market_stats, weights_opt)
+    returns = portfolio_returns(market_stats, weights_opt)
+
+    fig = simulation_scatter(sim_stds, sim_returns, sim_sharp_ratios, frontier=frontier, mode=chart_mode,
+                             title='Optimized Portfolio with Maximized Return for Given Risk')
                         
     fig.add_vline(x=selected_maximal_risk, line_width=2, line_color="red", 
                 annotation_text="maximal allowed risk", annotation_font_color='red', annotation_position="bottom right")
@@ -100,7 +162,8 @@ def run_optimize_app():
                 annotation_text="portfolio risk", annotation_font_color='red', annotation_position="bottom left")
     fig.add_hline(y=returns*100, line_width=2, line_dash="dash", line_color="green", 
                 annotation_text="portfolio return", annotation_font_color='green', annotation_position="top left")
-    st.plotly_chart(fig)
+    with stage('render risk cap chart'):
+        st.plotly_chart(fig)
 
     fig = px.bar(df_opt.T.sort_values('Investment [€]'),
                 orientation='h',
@@ -108,68 +171,76 @@ def run_optimize_app():
                 labels={"index": "stock", 'value': 'stock investment [€]'},
                 title="Optimal Investment Strategy for Given Risk Investing " + str(investment_sum) + '€.').update_layout(legend={'xanchor':'right', 'yanchor':'bottom'}
                 )
-    st.plotly_chart(fig)
+    with stage('render investment chart'):
+        st.plotly_chart(fig)
+
+    if optimization_mode == 'Exact Mean-Variance Solver':
+        # portfolio with maximal sharp ratio regardless of the risk
+        with stage('max sharp ratio solver'):
+            weights_sr = max_sharp_ratio(market_stats.mean, market_stats.cov, rfr=risk_free_rate/100, ntd=market_stats.ntd)
+        portfolio_return = portfolio_returns(market_stats, weights_sr)
+        portfolio_stdev = portfolio_std(market_stats, weights_sr)
+        portfolio_sr = portfolio_sharp_ratio(portfolio_return, portfolio_stdev, risk_free_rate/100, stats=market_stats)
+        df_sr = pd.DataFrame(data=weights_sr*investment_sum, index=stock_names, columns=['Investment [€]']).T
+        fig = px.bar(df_sr.T.sort_values('Investment [€]'),
+                    orientation='h',
+                    labels={"index": "stock", 'value': 'stock investment [€]'},
+                    title="Maximal Sharp Ratio Portfolio (sharp ratio={:.2f}, risk={:.3f}) Investing ".format(portfolio_sr*100, portfolio_stdev) + str(investment_sum) + '€.').update_layout(legend={'xanchor':'right', 'yanchor':'bottom'}
+                    )
+        with stage('render sharp ratio chart'):
+            st.plotly_chart(fig)
 
 
+    ########################################
+    # walk-forward backtest
+    ########################################
+    backtest_strategy = st.selectbox(label='select backtest strategy', options=['max sharp ratio', 'max return under risk', 'min variance', 'equal weights'])
+    backtest_years = st.slider(label='select backtest estimation window [years]', min_value=1, max_value=5, value=3, step=1)
+    backtest_expanding = st.checkbox('expanding estimation window')
+    if st.button('Run Walk-Forward Backtest'):
+        backtest_state = st.text('running backtest ...')
+        optimizer = strategies(rfr=risk_free_rate/100, max_risk=selected_maximal_risk, ntd=market_stats.ntd)[backtest_strategy]
+        daily, df_weights = walk_forward(market_stats, optimizer, window=backtest_years*market_stats.ntd, expanding=backtest_expanding, freq='M')
+        backtest_state.text('running backtest ...done!')
+        if len(daily) == 0:
+            st.warning('not enough data for the selected estimation window')
+        else:
+            st.table(pd.DataFrame([backtest_report(daily, rfr=risk_free_rate/100, ntd=market_stats.ntd)], index=[backtest_strategy]))
+            fig = px.line(x=daily.index, 
+                          y=investment_sum*(1 + daily).cumprod(),
+                          labels={'x': 'date', 'y': 'portfolio value [€]'},
+                          title='Out-of-Sample Value of ' + str(investment_sum) + '€ rebalanced monthly: ' + backtest_strategy)
+            with stage('render backtest chart'):
+                st.plotly_chart(fig)
+
     ########################################
     # run particle swarm optimization
     ########################################
     if st.button('Run Artificial Swarm Intelligence for further Optimization'):
         sim_state = st.text('running artificial swarm intelligence ...')
 
-        # import data
-        df = pd.read_csv(DATAPATH / 'data.csv', index_col='Date')
-        df.index = pd.to_datetime(df.index)
         # get stock names
-        stock_names = list(df.columns)
-        # make returns df
-        df_returns = normalized_returns(df)
+        stock_names = market_stats.columns
 
         ########################
         # particle swarm algo
         ########################
-        # define variable bounds
-        lbs = np.repeat(0.0, len(stock_names))
-        ubs = np.repeat(1.0, len(stock_names))
-        # initialize weights
-        x0 = weight_creator(df_returns)
-        # define objective function
-        def f(x):
-            # normalize weights
-            x = x/np.sum(x)
-            #calc portfolio´s sharp ratio
-            portfolio_return = portfolio_returns(df_returns, x)
-            portfolio_stdev = portfolio_std(df_returns, x) 
-            portfolio_sr = portfolio_sharp_ratio(portfolio_return, portfolio_stdev, risk_free_rate/100)
-            # add a penalty for risks higher than risk_limit
-            if portfolio_stdev > selected_maximal_risk:  
-                penalty = 10000*(portfolio_stdev - selected_maximal_risk)**2
-            elif portfolio_stdev < 0.9*selected_maximal_risk:  
-                penalty = 10000*(portfolio_stdev - selected_maximal_risk)**2
-            else:
-                penalty = 0    
-            return -portfolio_sr + penalty
-        # def constraint function 
-        def cons(x):
-            return [] # in this case, all the contraints are incorporated in the objective function f
-        # search best weights
-        weights_opt, fopt = pso(f, lbs, ubs, x0, cons)
+        # weights precomputed by the batch pipeline or another session for the same inputs are reused
+        swarm_version = store.get_or_commit(swarm_key(dataset_version, covariance_estimator, risk_free_rate/100, selected_maximal_risk),
+                                            lambda path: save_swarm_weights(run_swarm(market_stats, rfr=risk_free_rate/100, max_risk=selected_maximal_risk), 
+                                                                            stock_names, path))
+        weights_opt = load_swarm_weights(store.path(swarm_version))
         sim_state = st.text('running artificial swarm intelligence ...done!')
 
-        # normalize weights
-        weights_opt = weights_opt / np.sum(weights_opt)
         # calculate sharp ratio
-        portfolio_return = portfolio_returns(df_returns, weights_opt)
-        portfolio_stdev = portfolio_std(df_returns, weights_opt) 
-        portfolio_sr = portfolio_sharp_ratio(portfolio_return, portfolio_stdev, risk_free_rate/100)
+        portfolio_return = portfolio_returns(market_stats, weights_opt)
+        portfolio_stdev = portfolio_std(market_stats, weights_opt) 
+        portfolio_sr = portfolio_sharp_ratio(portfolio_return, portfolio_stdev, risk_free_rate/100, stats=market_stats)
 
         # plot returns vs risk
-        fig = px.scatter(x=df_simulation['portfolio standard dev'], 
-                        y=df_simulation['portfolio return']*100,
-                        color=df_simulation['portfolio sharp ratio']*100,
-                        labels={'y': 'return [%]', 'x': 'standard deviation', 'color': 'sharp ratio'},
-                        width=600,
-                        title='Portfolio´s Returns and Risks Monte-Carlo Simulation')
+        fig = simulation_scatter(sim_stds, sim_returns, sim_sharp_ratios, frontier=frontier, mode=chart_mode,
+                                 width=600,
+                                 title='Portfolio´s Returns and Risks Monte-Carlo Simulation')
 
         fig.add_scatter(x=np.array(portfolio_stdev), 
                         y=np.array(portfolio_return*100),
@@ -181,7 +252,8 @@ def run_optimize_app():
                     annotation_text="optimized return using swarm intelligence: sharp ratio={:.2f}".format(portfolio_sr*100), 
                     annotation_position="top right")
         fig.add_vline(x=portfolio_stdev, line_width=3, line_dash="dash", line_color="green")
-        st.plotly_chart(fig)
+        with stage('render swarm chart'):
+            st.plotly_chart(fig)
 
         # plotting optimal weights
         df_opt = pd.DataFrame(data=weights_opt*investment_sum, index=stock_names, columns=['Investment [€]']).T
@@ -192,6 +264,7 @@ def run_optimize_app():
                 labels={"index": "stock", 'value': 'stock investment [€]'},
                 title="Optimal Investment Strategy for Given Risk Investing " + str(investment_sum) + '€.').update_layout(legend={'xanchor':'right', 'yanchor':'bottom'}
                 )
-        st.plotly_chart(fig)
+        with stage('render swarm investment chart'):
+            st.plotly_chart(fig)
         
 
@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import logging
+import functools
+import threading
+import tracemalloc
+
+
+#####################################################
+# Stage Instrumentation
+#####################################################
+# Timing (and optionally peak memory) of named stages, recorded per thread, i.e. per streamlit script run.
+# Enabled by default with the environment variable PERF_INSTRUMENTATION=1 (PERF_MEMORY=1 adds memory tracking),
+# or per script run with enable(). When disabled, stage() returns a shared no-op context manager.
+
+logger = logging.getLogger('perf')
+
+_default_enabled = os.environ.get('PERF_INSTRUMENTATION', '0') == '1'
+_default_memory = os.environ.get('PERF_MEMORY', '0') == '1'
+_state = threading.local()
+# threads which turned on memory tracking with enable(), tracemalloc is stopped again when the last one turns it off
+_tracing_threads = set()
+_tracing_lock = threading.Lock()
+
+def _configure_logger():
+    """print the stage records as json lines unless the application configured the logger"""
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+
+if _default_enabled:
+    # enabled by the environment, e.g. for the batch pipeline: instrument the whole process
+    _configure_logger()
+    if _default_memory:
+        tracemalloc.start()
+
+def enabled()->bool:
+    return getattr(_state, 'enabled', _default_enabled)
+
+def _stop_tracing():
+    """stop the memory tracking of the current thread, tracemalloc stops with the last thread (call with _tracing_lock held)"""
+    if threading.get_ident() in _tracing_threads:
+        _tracing_threads.discard(threading.get_ident())
+        if not _tracing_threads:
+            tracemalloc.stop()
+
+def enable(memory:bool=_default_memory):
+    """turn on the instrumentation for the current thread, memory=True also tracks the peak memory per stage (slower)"""
+    _state.enabled = True
+    _state.memory = memory
+    with _tracing_lock:
+        if memory:
+            if not _tracing_threads and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _tracing_threads.add(threading.get_ident())
+            elif _tracing_threads:
+                _tracing_threads.add(threading.get_ident())
+        else:
+            _stop_tracing()
+    _configure_logger()
+
+def disable():
+    """turn off the instrumentation (and memory tracking started by enable) for the current thread"""
+    _state.enabled = False
+    with _tracing_lock:
+        _stop_tracing()
+
+def reset():
+    """forget the stages recorded so far in the current thread, call at the start of every page run"""
+    _state.records = []
+
+def records()->list:
+    """stages recorded in the current thread since the last reset"""
+    return getattr(_state, 'records', [])
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_null_stage = _NullStage()
+
+class _Stage:
+    def __init__(self, name:str, memory:bool):
+        self.name = name
+        self.memory = memory and tracemalloc.is_tracing()
+
+    def __enter__(self):
+        if self.memory:
+            self.mem_start = tracemalloc.get_traced_memory()[0]
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+        self.t_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record = {'stage': self.name, 'seconds': time.perf_counter() - self.t_start}
+        if self.memory:
+            # peak above the memory in use at the start of the stage (nested stages reset the peak of their parent)
+            record['peak_bytes'] = max(tracemalloc.get_traced_memory()[1] - self.mem_start, 0)
+        if not hasattr(_state, 'records'):
+            _state.records = []
+        _state.records.append(record)
+        logger.info(json.dumps(dict(record, thread=threading.current_thread().name)))
+        return False
+
+def stage(name:str):
+    """context manager timing the named stage"""
+    if not enabled():
+        return _null_stage
+    return _Stage(name, getattr(_state, 'memory', _default_memory))
+
+def timed(name:str=None):
+    """decorator timing every call of the function as a stage (named after the function by default)"""
+    def decorator(func):
+        label = name or func.__qualname__
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled():
+                return func(*args, **kwargs)
+            with stage(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def render_perf_expander():
+    """show the stages of the current page run in a streamlit expander"""
+    if not enabled():
+        return
+    import streamlit as st
+    import pandas as pd
+    with st.expander('performance'):
+        st.table(pd.DataFrame(records()))
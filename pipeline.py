@@ -0,0 +1,274 @@
+import os
+import json
+import hashlib
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from assets import asset_classes
+from covariance import ESTIMATORS, batch_portfolio_kpis
+from fetch import fetch_prices, drop_sparse_columns
+from forecast_store import ForecastCache
+from objective import make_objective
+from perf import timed
+from price_cache import PriceCache, YahooFetcher
+from pso import pso
+from solver import efficient_frontier
+from storage import frame_exists, frame_version, load_frame, save_frame, write_json_atomic
+from utils import MarketStats, mean_cov, trading_days, normalized_returns, find_stock_name, fill_missing_prices, weight_matrix_creator, simulate_portfolios_chunks, SimulationResults, FrontierIndex
+from workspace import DatasetStore, import_dataset, pipeline_simulation_key, simulation_key, swarm_key
+
+
+# set directories
+rootdir = os.getcwd()
+DATAPATH = Path(rootdir) / 'data'
+MODELPATH = Path(rootdir) / 'models'
+
+
+#####################################################
+# Pipeline Stages
+#####################################################
+
+@timed()
+def download_prices(tickers:list, start, end, price_cache:PriceCache, asset_mapping:dict=None, na_percentage:float=0.6, on_progress=None):
+    """Fetch the close prices of tickers, rename them to the stock names of asset_mapping, drop sparse stocks and fill missing prices.
+    Returns the clean price frame and the FetchReport."""
+    df, report = fetch_prices(tickers, start=start, end=end, price_cache=price_cache, on_progress=on_progress)
+    if asset_mapping is not None:
+        df.columns = [find_stock_name(asset_mapping, stock_ticker) or stock_ticker for stock_ticker in df.columns]
+    # make sure the index is datetime format
+    df.index = pd.to_datetime(df.index)
+    # drop nas, at least na_percentage percent rows must be none-nas
+    df = drop_sparse_columns(df, start, end, na_percentage=na_percentage, report=report)
+    return fill_missing_prices(df), report
+
+def stream_simulation(df_returns:pd.DataFrame, n_experiments:int, rfr:float, chunk_size:int=10000, seed=None):
+    """Generator running the monte-carlo simulation chunk-wise, yields the growing SimulationResults after every chunk.
+    Stopping the iteration early keeps the portfolios simulated so far."""
+    # preallocate all portfolios, growing the container would copy it
+    results = SimulationResults(list(df_returns.columns), capacity=n_experiments)
+    for w, returns, stds, srs in simulate_portfolios_chunks(df_returns, n_experiments, rfr=rfr, chunk_size=chunk_size, seed=seed):
+        results.append(w, returns, stds, srs)
+        yield results
+
+@timed()
+def run_simulation(df_returns:pd.DataFrame, n_experiments:int, rfr:float, seed=None)->SimulationResults:
+    """monte-carlo simulation of n_experiments random portfolios"""
+    results = None
+    for results in stream_simulation(df_returns, n_experiments, rfr, seed=seed):
+        pass
+    return results if results is not None else SimulationResults(list(df_returns.columns), capacity=0)
+
+@timed()
+def run_frontier(df_returns:pd.DataFrame, n_points:int, rfr:float)->SimulationResults:
+    """exact efficient frontier portfolios, stored like simulated portfolios"""
+    mean, cov = mean_cov(df_returns)
+    ntd = trading_days(df_returns)
+    w, _ = efficient_frontier(mean, cov, n_points=n_points, ntd=ntd)
+    returns, stds, srs = batch_portfolio_kpis(w, mean, cov, rfr, ntd)
+    return SimulationResults.from_arrays(w, returns, stds, srs, list(df_returns.columns))
+
+@timed()
+def run_swarm(df_returns:pd.DataFrame, rfr:float, max_risk:float, seed=None)->np.ndarray:
+    """particle swarm search for the maximal sharp ratio portfolio with risk in the band below max_risk, returns normalized weights"""
+    # define variable bounds
+    lbs = np.repeat(0.0, len(df_returns.columns))
+    ubs = np.repeat(1.0, len(df_returns.columns))
+    # initialize weights, drawn like the swarm from the seeded generator so the search is reproducible
+    rng = np.random.default_rng(seed)
+    x0 = weight_matrix_creator(1, len(df_returns.columns), rng)[0]
+    # define batched objective function: negative sharp ratio plus penalty for risks outside the band below the risk limit
+    f = make_objective(df_returns, rfr=rfr, max_risk=max_risk)
+    # search best weights, scoring the whole swarm per iteration
+    weights_opt, fopt = pso(f, lbs, ubs, x0=x0, patience=20, time_budget=30, seed=rng)
+    # normalize weights
+    return weights_opt / np.sum(weights_opt)
+
+def save_simulation(results:SimulationResults, datapath=DATAPATH)->pd.DataFrame:
+    """save simulation results sorted by risk together with their efficient frontier index"""
+    results.sort_by_std()
+    frontier = FrontierIndex.from_sorted(results.stds, results.returns)
+    df_simulation = results.df
+    save_frame(df_simulation, Path(datapath) / 'simulation') # save dataset to local folder
+    save_frame(frontier.to_df(), Path(datapath) / 'simulation_frontier')
+    return df_simulation
+
+def load_simulation(datapath=DATAPATH):
+    """load the risk-sorted simulation results and their efficient frontier index"""
+    df_simulation = load_frame(Path(datapath) / 'simulation')
+    if frame_exists(Path(datapath) / 'simulation_frontier'):
+        frontier = FrontierIndex.from_df(load_frame(Path(datapath) / 'simulation_frontier'), df_simulation)
+        if len(frontier.frontier_rows) == len(df_simulation):
+            return df_simulation, frontier
+    # simulation saved without (matching) frontier index, sort it by risk first
+    df_simulation = df_simulation.sort_values(by='portfolio standard dev', ignore_index=True)
+    frontier = FrontierIndex.from_sorted(df_simulation['portfolio standard dev'].values, df_simulation['portfolio return'].values)
+    return df_simulation, frontier
+
+def save_swarm_weights(weights:np.ndarray, stock_names:list, datapath=DATAPATH):
+    """save the normalized weights found by the particle swarm"""
+    save_frame(pd.DataFrame([weights], columns=stock_names), Path(datapath) / 'swarm_weights')
+
+def load_swarm_weights(datapath=DATAPATH)->np.ndarray:
+    return load_frame(Path(datapath) / 'swarm_weights').values[0]
+
+
+
+#####################################################
+# Cached Pipeline
+#####################################################
+
+class Pipeline:
+    """Headless pipeline running download -> returns -> simulation -> swarm -> forecasts as separate steps.
+    Every step records a stamp of its inputs (parameters and upstream stamps) and is skipped while
+    its stamp is unchanged and its artifacts exist. The web pages read the artifacts written here:
+    the price data (imported into the workspace store by the pages), the simulation and swarm weights
+    (committed to the workspace store under the keys the pages look up) and the forecast store."""
+
+    def __init__(self, datapath=DATAPATH, modelpath=MODELPATH, fetcher=None, force:bool=False, log=print, store:DatasetStore=None):
+        self.datapath = Path(datapath)
+        self.modelpath = Path(modelpath)
+        self.datapath.mkdir(parents=True, exist_ok=True)
+        self.modelpath.mkdir(parents=True, exist_ok=True)
+        self.store = store if store is not None else DatasetStore(self.datapath / 'workspace')
+        self.price_cache = PriceCache(self.datapath / 'prices', fetcher if fetcher is not None else YahooFetcher())
+        self.force = force
+        self.log = log
+        self._state_path = self.datapath / 'pipeline_state.json'
+
+    def _read_state(self)->dict:
+        if not self._state_path.exists():
+            return {}
+        with open(self._state_path) as f:
+            return json.load(f)
+
+    def _write_state(self, state:dict):
+        write_json_atomic(state, self._state_path, indent=2)
+
+    def _run_step(self, name:str, inputs:dict, artifacts:list, func, complete=None)->str:
+        """Run func unless the step already ran with the same inputs, its artifacts exist and complete() (if given)
+        confirms artifacts stored elsewhere. If func returns False, its artifacts are incomplete (e.g. failed downloads):
+        the stamp is not recorded then, so the step runs again next time. Returns the step´s stamp."""
+        stamp = hashlib.sha1(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+        if (not self.force and self._read_state().get(name) == stamp and all(frame_exists(self.datapath / artifact) for artifact in artifacts)
+                and (complete is None or complete())):
+            self.log(name + ': up to date')
+            return stamp
+        self.log(name + ': running ...')
+        if func() is False:
+            self.log(name + ': incomplete, runs again next time')
+            return stamp
+        state = self._read_state()
+        state[name] = stamp
+        self._write_state(state)
+        self.log(name + ': done')
+        return stamp
+
+    def download(self, tickers:list, start, end, asset_mapping:dict=None, na_percentage:float=0.6)->str:
+        """fetch, clean and save the price data"""
+        def step():
+            df, report = download_prices(tickers, start, end, self.price_cache, asset_mapping=asset_mapping, na_percentage=na_percentage)
+            for ticker, error in report.failed.items():
+                self.log('  failed to download {}: {}'.format(ticker, error))
+            for ticker, error in report.partial.items():
+                self.log('  partially downloaded {}: {}'.format(ticker, error))
+            for stock in report.dropped:
+                self.log('  dropped for too many missing values: ' + stock)
+            save_frame(df, self.datapath / 'data')
+            # failed and partially downloaded tickers are fetched again by the next run
+            return not report.failed and not report.partial
+        inputs = {'tickers': list(tickers), 'start': start, 'end': end, 'asset_mapping': asset_mapping, 'na_percentage': na_percentage}
+        stamp = self._run_step('download', inputs, ['data'], step)
+        # the saved data changes when an incomplete download is completed, the downstream steps must run again then
+        return hashlib.sha1((stamp + str(frame_version(self.datapath / 'data'))).encode()).hexdigest()
+
+    def returns(self, data_stamp:str)->str:
+        """compute and save the normalized daily returns"""
+        def step():
+            save_frame(normalized_returns(load_frame(self.datapath / 'data')), self.datapath / 'returns')
+        return self._run_step('returns', {'data': data_stamp}, ['returns'], step)
+
+    def _dataset_version(self)->str:
+        """workspace store version of the saved price data"""
+        return import_dataset(self.store, self.datapath / 'data')
+
+    def simulate(self, returns_stamp:str, n_experiments:int, rfr:float, mode:str='monte-carlo', estimator:str='sample', seed=None)->str:
+        """Simulate portfolios (or solve the exact frontier) with the given covariance estimator and commit them with their
+        frontier index to the workspace store, as the simulation of these inputs and as the pipeline´s simulation of the dataset."""
+        def step():
+            df_returns = MarketStats(load_frame(self.datapath / 'returns'), estimator=estimator)
+            if mode == 'exact':
+                results = run_frontier(df_returns, n_experiments, rfr)
+            else:
+                results = run_simulation(df_returns, n_experiments, rfr, seed=seed)
+            dataset_version = self._dataset_version()
+            version = self.store.commit(lambda path: save_simulation(results, path))
+            self.store.set_ref(simulation_key(dataset_version, estimator, mode, n_experiments, rfr), version)
+            self.store.set_ref(pipeline_simulation_key(dataset_version, estimator, mode), version)
+        def complete():
+            # committed versions are garbage-collected once unused for a while
+            return self.store.lookup(pipeline_simulation_key(self._dataset_version(), estimator, mode)) is not None
+        inputs = {'returns': returns_stamp, 'n_experiments': n_experiments, 'rfr': rfr, 'mode': mode, 'estimator': estimator, 'seed': seed}
+        return self._run_step('simulate', inputs, ['data'], step, complete=complete)
+
+    def swarm(self, returns_stamp:str, rfr:float, max_risk:float, estimator:str='sample', seed=None)->str:
+        """run the particle swarm optimization with the given covariance estimator and commit the optimal weights to the workspace store"""
+        def step():
+            df_returns = MarketStats(load_frame(self.datapath / 'returns'), estimator=estimator)
+            weights_opt = run_swarm(df_returns, rfr, max_risk, seed=seed)
+            version = self.store.commit(lambda path: save_swarm_weights(weights_opt, df_returns.columns, path))
+            self.store.set_ref(swarm_key(self._dataset_version(), estimator, rfr, max_risk), version)
+        def complete():
+            return self.store.lookup(swarm_key(self._dataset_version(), estimator, rfr, max_risk)) is not None
+        inputs = {'returns': returns_stamp, 'rfr': rfr, 'max_risk': max_risk, 'estimator': estimator, 'seed': seed}
+        return self._run_step('swarm', inputs, ['data'], step, complete=complete)
+
+    def forecast(self, data_stamp:str, max_workers:int=None, threads_per_worker:int=1)->str:
+        """fit the forecast models of all stocks into the forecast store"""
+        def step():
+            from batch_forecast import forecast_all
+            errors = forecast_all(self.datapath, self.modelpath, max_workers=max_workers, threads_per_worker=threads_per_worker)
+            for stock, error in errors.items():
+                self.log('  forecast failed for {}: {}'.format(stock, error))
+        def complete():
+            # the forecast store evicts models, so check it holds the model of every stock´s current prices
+            cache = ForecastCache(self.modelpath)
+            df = load_frame(self.datapath / 'data')
+            return all(cache.has(stock, df[stock]) for stock in df.columns)
+        return self._run_step('forecast', {'data': data_stamp}, ['data'], step, complete=complete)
+
+    def run(self, tickers:list, start, end, asset_mapping:dict=None, n_experiments:int=10000, rfr:float=0.03, mode:str='monte-carlo',
+            max_risk:float=None, estimator:str='sample', forecasts:bool=False, seed=None):
+        """run all steps, the swarm only if a maximal risk is given and the forecasts only if asked for"""
+        data_stamp = self.download(tickers, start, end, asset_mapping=asset_mapping)
+        returns_stamp = self.returns(data_stamp)
+        self.simulate(returns_stamp, n_experiments, rfr, mode=mode, estimator=estimator, seed=seed)
+        if max_risk is not None:
+            self.swarm(returns_stamp, rfr, max_risk, estimator=estimator, seed=seed)
+        if forecasts:
+            self.forecast(data_stamp)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='download stock data and run the portfolio optimization without the web app')
+    parser.add_argument('--asset-class', default='tech assets', choices=list(asset_classes.keys()), help='asset class to download')
+    parser.add_argument('--tickers', nargs='*', default=None, help='tickers to download instead of an asset class')
+    parser.add_argument('--start', default='2010-1-1', help='first day of the price data')
+    parser.add_argument('--end', default='2023-2-28', help='day after the last day of the price data')
+    parser.add_argument('--n-experiments', type=int, default=10000, help='number of simulated portfolios (frontier points in exact mode)')
+    parser.add_argument('--risk-free-rate', type=float, default=3.0, help='risk free interest rate in percent')
+    parser.add_argument('--mode', default='monte-carlo', choices=['monte-carlo', 'exact'], help='simulate portfolios or solve the exact frontier')
+    parser.add_argument('--covariance', default='sample', choices=list(ESTIMATORS.keys()), help='covariance estimator of the daily returns')
+    parser.add_argument('--max-risk', type=float, default=None, help='maximal risk for the particle swarm optimization')
+    parser.add_argument('--forecasts', action='store_true', help='also fit the price forecasts of all stocks')
+    parser.add_argument('--seed', type=int, default=None, help='random seed')
+    parser.add_argument('--force', action='store_true', help='rerun all steps even if their inputs are unchanged')
+    args = parser.parse_args()
+
+    if args.tickers:
+        tickers, asset_mapping = args.tickers, None
+    else:
+        asset_mapping = asset_classes[args.asset_class]
+        tickers = list(asset_mapping.values())
+    Pipeline(force=args.force).run(tickers, args.start, args.end, asset_mapping=asset_mapping, n_experiments=args.n_experiments,
+                                   rfr=args.risk_free_rate/100, mode=args.mode, max_risk=args.max_risk, estimator=args.covariance, forecasts=args.forecasts, seed=args.seed)
@@ -0,0 +1,70 @@
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+
+
+#####################################################
+# Downsampled Portfolio Plots
+#####################################################
+
+def _bin_quotas(counts:np.ndarray, max_points:int)->np.ndarray:
+    """Number of points per bin summing up to max_points (if there are as many), as equal as possible:
+    bins with fewer points than their share keep all of them and pass the rest of their share on to fuller bins."""
+    if counts.sum() <= max_points:
+        return counts.copy()
+    # largest cap with sum(min(counts, cap)) <= max_points
+    remaining = max_points
+    for i, count in enumerate(np.sort(counts)):
+        n_open = len(counts) - i
+        if count*n_open >= remaining:
+            cap = remaining // n_open
+            break
+        remaining -= count
+    quotas = np.minimum(counts, cap)
+    # hand the remainder of the integer division to bins with points left
+    extra = max_points - quotas.sum()
+    quotas[np.flatnonzero(counts > quotas)[:extra]] += 1
+    return quotas
+
+def stratified_sample(stds:np.ndarray, max_points:int=5000, n_bins:int=100, seed:int=0)->np.ndarray:
+    """Sorted rows of at most max_points portfolios sampled evenly across n_bins standard deviation bins,
+    so sparsely populated risk ranges keep all their portfolios. The share of sparse or empty bins
+    goes to the populated ones, so max_points are returned whenever there are as many portfolios."""
+    n = len(stds)
+    if n <= max_points:
+        return np.arange(n)
+    rng = np.random.default_rng(seed)
+    span = np.ptp(stds) or 1.0
+    bins = np.minimum(((stds - stds.min()) / span*n_bins).astype(int), n_bins - 1)
+    quotas = _bin_quotas(np.bincount(bins, minlength=n_bins), max_points)
+    # rank the rows within their bin in random order and keep the first quota of each bin
+    rows = rng.permutation(n)
+    rows = rows[np.argsort(bins[rows], kind='stable')]
+    bins_sorted = bins[rows]
+    starts = np.searchsorted(bins_sorted, np.arange(n_bins))
+    rank = np.arange(n) - starts[bins_sorted]
+    return np.sort(rows[rank < quotas[bins_sorted]])
+
+def frontier_hull_rows(frontier)->np.ndarray:
+    """rows of the portfolios on the efficient frontier (upper envelope) of a risk-sorted simulation"""
+    return np.unique(frontier.frontier_rows)
+
+def simulation_scatter(stds:np.ndarray, returns:np.ndarray, sharp_ratios:np.ndarray, frontier=None, mode:str='sampled',
+                       max_points:int=5000, n_bins:int=100, **kwargs):
+    """Scatter plot of simulated portfolios (returns vs. standard deviation, colored by sharp ratio) with a bounded payload.
+    mode 'sampled' plots a stratified sample, 'density' a 2d histogram of the portfolios, 'all points' every portfolio.
+    In the first two modes the exact efficient frontier of the FrontierIndex is drawn on top."""
+    labels = {'y': 'return [%]', 'x': 'standard deviation', 'color': 'sharp ratio'}
+    if mode == 'density':
+        counts, x_edges, y_edges = np.histogram2d(stds, returns*100, bins=n_bins)
+        fig = go.Figure(go.Heatmap(x=(x_edges[:-1] + x_edges[1:]) / 2, y=(y_edges[:-1] + y_edges[1:]) / 2,
+                                   z=np.where(counts.T > 0, counts.T, np.nan), colorscale='Viridis', colorbar={'title': 'portfolios'}))
+        fig.update_layout(xaxis_title=labels['x'], yaxis_title=labels['y'], **kwargs)
+    else:
+        rows = np.arange(len(stds)) if mode == 'all points' else stratified_sample(stds, max_points=max_points, n_bins=n_bins)
+        fig = px.scatter(x=stds[rows], y=returns[rows]*100, color=sharp_ratios[rows]*100, labels=labels, **kwargs)
+    if frontier is not None and mode != 'all points':
+        rows = frontier_hull_rows(frontier)
+        fig.add_scatter(x=stds[rows], y=returns[rows]*100, mode='lines', line=dict(color='black', width=2), name='efficient frontier')
+    fig.layout.showlegend = False
+    return fig
@@ -0,0 +1,186 @@
+import json
+import fcntl
+import inspect
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import quote
+import pandas as pd
+from storage import frame_exists, load_frame, save_frame, write_json_atomic
+
+
+#####################################################
+# Price Fetchers
+#####################################################
+
+class YahooFetcher:
+    """Fetch daily close prices from the yahoo finance api. Safe to call from several threads:
+    yf.download resets and reads module-global result dicts on every call, the per-ticker history request does not."""
+
+    def fetch(self, ticker:str, start:pd.Timestamp, end:pd.Timestamp)->pd.Series:
+        """return the close prices of ticker from start (inclusive) to end (exclusive)"""
+        import yfinance as yf
+        history = yf.Ticker(ticker).history
+        kwargs = {'start': start.strftime('%Y-%m-%d'), 'end': end.strftime('%Y-%m-%d'), 'auto_adjust': False, 'actions': False}
+        # raise download errors instead of printing them and returning an empty frame, where supported
+        parameters = inspect.signature(history).parameters
+        kwargs.update({name: value for name, value in (('raise_errors', True), ('debug', False)) if name in parameters})
+        try:
+            df = history(**kwargs)
+        except Exception as error:
+            raise ConnectionError('failed to download {}: {!r}'.format(ticker, error)) from error
+        if len(df) == 0:
+            # yahoo reports unknown tickers with an empty frame, only short ranges (weekends, holidays) may legitimately be empty
+            if end - start > pd.Timedelta(days=7):
+                raise ValueError('no data returned for ' + ticker)
+            return pd.Series([], index=pd.DatetimeIndex([], name='Date'), dtype=float, name=ticker)
+        close = df['Close'].astype(float)
+        close.index = pd.to_datetime(close.index)
+        if close.index.tz is not None:
+            # history returns the dates in the exchange´s time zone
+            close.index = close.index.tz_localize(None)
+        close.index.name = 'Date'
+        return close.rename(ticker)
+
+class LocalFetcher:
+    """Fetch prices from a local wide dataframe (one column per ticker, datetime index), e.g. to run offline."""
+
+    def __init__(self, df:pd.DataFrame):
+        self.df = df
+
+    def fetch(self, ticker:str, start:pd.Timestamp, end:pd.Timestamp)->pd.Series:
+        """return the close prices of ticker from start (inclusive) to end (exclusive)"""
+        series = self.df[ticker].dropna()
+        return series[(series.index >= start) & (series.index < end)].astype(float).rename(ticker)
+
+
+
+#####################################################
+# Price Cache
+#####################################################
+
+class PartialFetchError(Exception):
+    """Fetching some gaps of a ticker failed. The gaps fetched successfully are cached,
+    series holds the prices available for the requested range and errors the error per failed gap."""
+
+    def __init__(self, ticker:str, errors:dict, series:pd.Series):
+        super().__init__('failed to fetch {} gap(s) of {}: {}'.format(len(errors), ticker, '; '.join(repr(e) for e in errors.values())))
+        self.ticker = ticker
+        self.errors = errors
+        self.series = series
+
+def _merge_ranges(ranges:list)->list:
+    """merge overlapping or adjacent [start, end) date ranges"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def _missing_ranges(start:pd.Timestamp, end:pd.Timestamp, covered:list)->list:
+    """return the parts of the [start, end) date range not covered by the (merged) covered ranges"""
+    gaps = []
+    cursor = start
+    for covered_start, covered_end in covered:
+        if covered_end <= cursor:
+            continue
+        if covered_start >= end:
+            break
+        if covered_start > cursor:
+            gaps.append((cursor, covered_start))
+        cursor = covered_end
+        if cursor >= end:
+            break
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+class PriceCache:
+    """On-disk cache of daily close prices, one series per ticker.
+    Every ticker remembers the date ranges already fetched, so only missing gaps are requested from the fetcher."""
+
+    def __init__(self, cachedir, fetcher=None):
+        self.cachedir = Path(cachedir)
+        self.cachedir.mkdir(parents=True, exist_ok=True)
+        self.fetcher = fetcher if fetcher is not None else YahooFetcher()
+
+    def _path(self, ticker:str)->Path:
+        # tickers like '^GDAXI', 'DB1:DE' or 'DTE.DE' are quoted into safe file names without suffix dots
+        return self.cachedir / quote(ticker, safe='').replace('.', '%2E')
+
+    def coverage(self, ticker:str)->list:
+        """return the merged [start, end) date ranges already fetched for ticker"""
+        path = self._path(ticker).with_suffix('.coverage.json')
+        if not path.exists():
+            return []
+        with open(path) as f:
+            return [(pd.Timestamp(start), pd.Timestamp(end)) for start, end in json.load(f)]
+
+    def _save_coverage(self, ticker:str, ranges:list):
+        write_json_atomic([(start.isoformat(), end.isoformat()) for start, end in ranges], self._path(ticker).with_suffix('.coverage.json'))
+
+    @contextmanager
+    def _locked(self, ticker:str):
+        """hold an exclusive lock on the cache files of ticker across threads and processes"""
+        with open(self._path(ticker).with_suffix('.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self, ticker:str)->pd.Series:
+        """return all cached prices of ticker"""
+        path = self._path(ticker)
+        if not frame_exists(path):
+            return pd.Series([], index=pd.DatetimeIndex([], name='Date'), dtype=float, name=ticker)
+        return load_frame(path)['Close'].rename(ticker)
+
+    def missing_ranges(self, ticker:str, start, end)->list:
+        """return the [start, end) date ranges which still have to be fetched for ticker"""
+        return _missing_ranges(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize(), self.coverage(ticker))
+
+    def get(self, ticker:str, start, end)->pd.Series:
+        """Return the close prices of ticker from start (inclusive) to end (exclusive), fetching only the missing gaps.
+        A gap counts as covered only up to the last day the fetcher returned, so empty or short answers are fetched again.
+        Raises PartialFetchError after caching the other gaps if fetching any gap failed."""
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        with self._locked(ticker):
+            covered = self.coverage(ticker)
+            gaps = _missing_ranges(start, end, covered)
+            series = self.load(ticker)
+            errors = {}
+            fetched = []
+            for gap in gaps:
+                try:
+                    fetched.append((gap, self.fetcher.fetch(ticker, *gap)))
+                except Exception as e:
+                    errors[gap] = e
+            if fetched:
+                series = pd.concat([series] + [gap_series for _, gap_series in fetched])
+                series = series[~series.index.duplicated(keep='last')].sort_index()
+                series.index.name = 'Date'
+                save_frame(series.to_frame('Close'), self._path(ticker))
+                # days from today on are not final yet and are fetched again next time
+                today = pd.Timestamp.today().normalize()
+                new_ranges = []
+                for (gap_start, gap_end), gap_series in fetched:
+                    if len(gap_series) == 0:
+                        continue
+                    covered_end = min(pd.Timestamp(gap_series.index.max()).normalize() + pd.Timedelta(days=1), gap_end, today)
+                    if covered_end > gap_start:
+                        new_ranges.append((gap_start, covered_end))
+                if new_ranges:
+                    self._save_coverage(ticker, _merge_ranges(covered + new_ranges))
+        series = series[(series.index >= start) & (series.index < end)].rename(ticker)
+        if errors:
+            raise PartialFetchError(ticker, errors, series)
+        return series
+
+    def get_frame(self, tickers:list, start, end)->pd.DataFrame:
+        """Assemble the wide close price frame (one column per ticker) from the cache."""
+        df = pd.concat([self.get(ticker, start, end) for ticker in tickers], axis=1)
+        df.columns = list(tickers)
+        df.index.name = 'Date'
+        return df
@@ -0,0 +1,58 @@
+import time
+import numpy as np
+
+
+#####################################################
+# Particle Swarm Optimization
+#####################################################
+
+def pso(func, lb, ub, x0=None, swarmsize:int=100, omega:float=0.5, phip:float=0.5, phig:float=0.5, maxiter:int=100, 
+        minstep:float=1e-8, minfunc:float=1e-8, patience:int=None, time_budget:float=None, seed=None):
+    """Minimize func with a particle swarm, scoring the whole swarm at once.
+    func takes a (swarmsize, dimensions) matrix of positions and returns one objective value per row.
+    Defaults follow pyswarm.pso. Besides the pyswarm stopping criteria (minstep, minfunc, maxiter) the search stops 
+    after patience iterations without improvement of the swarm's best position or when time_budget seconds are used up.
+    Returns the best position and its objective value."""
+    t_start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    lb = np.asarray(lb, dtype=float)
+    ub = np.asarray(ub, dtype=float)
+    vhigh = np.abs(ub - lb)
+    vlow = -vhigh
+    # initialize particle positions and velocities
+    x = lb + rng.random((swarmsize, len(lb)))*(ub - lb)
+    if x0 is not None:
+        x[0] = x0
+    v = vlow + rng.random((swarmsize, len(lb)))*(vhigh - vlow)
+    # particles´ and swarm´s best positions
+    p = x.copy()
+    fp = np.asarray(func(x), dtype=float)
+    i_best = np.argmin(fp)
+    g = p[i_best].copy()
+    fg = fp[i_best]
+    n_stalled = 0
+    for _ in range(maxiter):
+        rp = rng.random(x.shape)
+        rg = rng.random(x.shape)
+        v = omega*v + phip*rp*(p - x) + phig*rg*(g - x)
+        x = np.clip(x + v, lb, ub)
+        fx = np.asarray(func(x), dtype=float)
+        improved = fx < fp
+        p[improved] = x[improved]
+        fp[improved] = fx[improved]
+        i_best = np.argmin(fp)
+        if fp[i_best] < fg:
+            step = np.linalg.norm(g - p[i_best])
+            gain = fg - fp[i_best]
+            g = p[i_best].copy()
+            fg = fp[i_best]
+            n_stalled = 0
+            if step <= minstep or gain <= minfunc:
+                break
+        else:
+            n_stalled += 1
+            if patience is not None and n_stalled >= patience:
+                break
+        if time_budget is not None and time.perf_counter() - t_start > time_budget:
+            break
+    return g, fg
@@ -0,0 +1,96 @@
+import numpy as np
+from covariance import NTD, as_covariance, batch_portfolio_kpis, portfolio_stds
+
+
+#####################################################
+# Long-Only Mean-Variance Solver
+#####################################################
+# All problems are solved on the probability simplex (weights >= 0, summing up to one) with
+# accelerated projected gradient descent on the trade-off  w´Σw - lam * µ´w,  batched over many lam at once.
+# lam = 0 gives the minimum variance portfolio, growing lam moves the solution along the efficient frontier
+# up to the maximal return portfolio. Risks are annualized standard deviations (covariance.portfolio_stds) with ntd trading days.
+# The covariance is an array or a covariance model (see covariance.py), factor models are never expanded to (k, k) matrices.
+
+def project_simplex(V:np.ndarray)->np.ndarray:
+    """Euclidean projection of every row of V onto the probability simplex."""
+    V = np.atleast_2d(V)
+    n, k = V.shape
+    U = -np.sort(-V, axis=1)
+    css = np.cumsum(U, axis=1) - 1
+    cond = U - css / np.arange(1, k + 1) > 0
+    # last position where the condition holds
+    rho = k - 1 - np.argmax(cond[:, ::-1], axis=1)
+    theta = css[np.arange(n), rho] / (rho + 1)
+    return np.maximum(V - theta[:, None], 0)
+
+def solve_tradeoff(mean:np.ndarray, cov:np.ndarray, lams, w0:np.ndarray=None, n_iter:int=1000, tol:float=1e-9)->np.ndarray:
+    """Minimize w´Σw - lam * µ´w over the simplex for every lam, returns one row of weights per lam."""
+    lams = np.atleast_1d(np.asarray(lams, dtype=float))
+    k = len(mean)
+    cov = as_covariance(cov)
+    step = 1 / (2*cov.max_eigenvalue())
+    W = np.full((len(lams), k), 1/k) if w0 is None else np.array(w0, dtype=float)
+    Y = W.copy()
+    t = 1.0
+    for _ in range(n_iter):
+        grad = 2*cov.dot(Y) - lams[:, None]*mean[None, :]
+        W_new = project_simplex(Y - step*grad)
+        t_new = (1 + np.sqrt(1 + 4*t**2)) / 2
+        Y = W_new + ((t - 1) / t_new)*(W_new - W)
+        converged = np.max(np.abs(W_new - W)) < tol
+        W, t = W_new, t_new
+        if converged:
+            break
+    return W
+
+def max_tradeoff(mean:np.ndarray, cov:np.ndarray)->float:
+    """Smallest lam from which on the maximal return asset alone solves the trade-off problem."""
+    j = np.argmax(mean)
+    gap = mean[j] - mean
+    others = gap > 0
+    if not np.any(others):
+        return 0.0
+    cov_j = as_covariance(cov).row(j)
+    return float(np.max(2*(cov_j[j] - cov_j[others]) / gap[others]))
+
+def max_return_under_risk(mean:np.ndarray, cov:np.ndarray, max_risks, n_bisections:int=25, ntd:int=NTD):
+    """Long-only portfolios with maximal return and risk not above each of max_risks.
+    Bisection over the trade-off lam, all risk caps are solved together.
+    Caps below the minimal achievable risk give the minimum variance portfolio.
+    Returns the weights (one row per cap) and the corresponding lams."""
+    max_risks = np.atleast_1d(np.asarray(max_risks, dtype=float))
+    lo = np.zeros(len(max_risks))
+    hi = np.full(len(max_risks), max_tradeoff(mean, cov))
+    W_lo = solve_tradeoff(mean, cov, lo)
+    W = W_lo
+    for _ in range(n_bisections):
+        mid = (lo + hi) / 2
+        W = solve_tradeoff(mean, cov, mid, w0=W)
+        feasible = portfolio_stds(W, cov, ntd) <= max_risks
+        lo = np.where(feasible, mid, lo)
+        hi = np.where(feasible, hi, mid)
+        W_lo = np.where(feasible[:, None], W, W_lo)
+    # caps beyond the maximal return portfolio´s risk
+    W_hi = solve_tradeoff(mean, cov, hi, w0=W)
+    feasible = portfolio_stds(W_hi, cov, ntd) <= max_risks
+    return np.where(feasible[:, None], W_hi, W_lo), np.where(feasible, hi, lo)
+
+def efficient_frontier(mean:np.ndarray, cov:np.ndarray, n_points:int=100, ntd:int=NTD):
+    """Long-only efficient frontier at n_points risks evenly spaced between the minimum variance
+    and the maximal return portfolio. Returns the weights (one row per point) and the corresponding lams."""
+    min_risk = portfolio_stds(solve_tradeoff(mean, cov, 0.0), cov, ntd)[0]
+    max_risk = np.sqrt(np.max(as_covariance(cov).diag[mean == np.max(mean)]))*np.sqrt(ntd)
+    return max_return_under_risk(mean, cov, np.linspace(min_risk, max_risk, n_points), ntd=ntd)
+
+def max_sharp_ratio(mean:np.ndarray, cov:np.ndarray, rfr:float, n_points:int=50, n_refinements:int=3, ntd:int=NTD)->np.ndarray:
+    """Long-only portfolio with maximal sharp ratio (see utils.portfolio_sharp_ratio).
+    The best frontier point is refined by repeatedly searching a finer lam grid around it."""
+    def sharp_ratios(W):
+        return batch_portfolio_kpis(W, mean, cov, rfr, ntd)[2]
+    lams = np.linspace(0, max_tradeoff(mean, cov), n_points)
+    for _ in range(n_refinements + 1):
+        W = solve_tradeoff(mean, cov, lams)
+        i = np.argmax(sharp_ratios(W))
+        w_best = W[i]
+        lams = np.linspace(lams[max(i - 1, 0)], lams[min(i + 1, len(lams) - 1)], n_points)
+    return w_best
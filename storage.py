@@ -0,0 +1,147 @@
+import os
+import json
+import uuid
+import threading
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from perf import timed
+
+
+#####################################################
+# Binary Columnar Storage
+#####################################################
+
+def _paths(path):
+    """return the values, index and metadata file paths of a stored frame given its path without suffix"""
+    path = Path(path)
+    return path.with_suffix('.npy'), path.with_suffix('.index.npy'), path.with_suffix('.json')
+
+def _tmp_path(path:Path)->Path:
+    """unique temporary file next to path, so concurrent writers of the same file never share a temporary file"""
+    path = Path(path)
+    return path.with_name(path.name + '.' + uuid.uuid4().hex + '.tmp')
+
+def _atomic_save_npy(path:Path, array:np.ndarray):
+    """write array to a temporary file first and move it in place, so readers never see a half-written file"""
+    tmp_path = _tmp_path(path)
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+def write_json_atomic(obj, path, **kwargs):
+    """write obj as json file via a unique temporary file, so readers never see a half-written file"""
+    tmp_path = _tmp_path(path)
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(obj, f, **kwargs)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+def save_frame(df:pd.DataFrame, path, csv:bool=False):
+    """Save a numeric dataframe in binary columnar format: the values as float64 .npy file,
+    the index as .index.npy file and column names plus index info as .json metadata sidecar.
+    The index must be datetime, numeric or string valued (strings are stored as fixed-width unicode).
+    path is given without suffix, e.g. DATAPATH / 'data'. Set csv=True to additionally export a csv file."""
+    values_path, index_path, meta_path = _paths(path)
+    values = np.ascontiguousarray(df.values, dtype=np.float64)
+    index = df.index
+    if isinstance(index, pd.DatetimeIndex):
+        index_kind = 'datetime'
+        _atomic_save_npy(index_path, index.values.astype('datetime64[ns]').view(np.int64))
+    elif isinstance(index, pd.RangeIndex) and index.start == 0 and index.step == 1:
+        index_kind = 'range'
+    else:
+        index_kind = 'values'
+        index_values = np.asarray(index)
+        if index_values.dtype == object:
+            # object arrays could only be read back with pickle
+            if not all(isinstance(value, str) for value in index_values):
+                raise TypeError('cannot store an index of mixed or non-numeric objects, convert it to strings first')
+            index_values = index_values.astype(str)
+        _atomic_save_npy(index_path, index_values)
+    _atomic_save_npy(values_path, values)
+    # the metadata is written last, it marks the stored frame as complete
+    meta = {'columns': [str(col) for col in df.columns], 'index_name': index.name, 'index_kind': index_kind}
+    write_json_atomic(meta, meta_path)
+    if csv:
+        df.to_csv(Path(path).with_suffix('.csv'))
+
+def _read_frame(path)->pd.DataFrame:
+    """read a stored frame memory-mapping its values, fall back to a csv export if there is no binary version"""
+    values_path, index_path, meta_path = _paths(path)
+    if not meta_path.exists():
+        df = pd.read_csv(Path(path).with_suffix('.csv'), index_col=0)
+        if df.index.name == 'Date':
+            df.index = pd.to_datetime(df.index)
+        return df
+    with open(meta_path) as f:
+        meta = json.load(f)
+    values = np.load(values_path, mmap_mode='r')
+    if meta['index_kind'] == 'datetime':
+        index = pd.DatetimeIndex(np.load(index_path).view('datetime64[ns]'), name=meta['index_name'])
+    elif meta['index_kind'] == 'range':
+        index = pd.RangeIndex(len(values), name=meta['index_name'])
+    else:
+        index = pd.Index(np.load(index_path), name=meta['index_name'])
+    return pd.DataFrame(values, index=index, columns=meta['columns'], copy=False)
+
+def frame_version(path):
+    """return a token identifying the stored version of a frame (changes whenever the frame is saved again)"""
+    values_path, index_path, meta_path = _paths(path)
+    for file_path in (meta_path, Path(path).with_suffix('.csv')):
+        if file_path.exists():
+            return (str(file_path), file_path.stat().st_mtime_ns)
+    return None
+
+def frame_exists(path)->bool:
+    """check whether a frame has been stored under path, in binary or csv format"""
+    return frame_version(path) is not None
+
+class FrameCache:
+    """Per-process cache of objects built from stored frames, rebuilt whenever the frame is saved again.
+    Keeps the max_entries most recently used entries and drops entries whose frame was deleted
+    (e.g. a garbage-collected dataset version), so their memory maps do not hold on to the deleted files."""
+
+    def __init__(self, max_entries:int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, path, build):
+        """return build() for the stored frame at path, called once per version of the frame and key"""
+        version = frame_version(path)
+        if version is None:
+            raise FileNotFoundError('no stored frame found at ' + str(path))
+        with self._lock:
+            for cached_key, (cached_path, _, _) in list(self._entries.items()):
+                if frame_version(cached_path) is None:
+                    del self._entries[cached_key]
+            cached = self._entries.get(key)
+            if cached is None or cached[1] != version:
+                cached = (path, version, build())
+                self._entries[key] = cached
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return cached[2]
+
+# frames loaded in this process
+_loaded_frames = FrameCache(max_entries=32)
+
+@timed()
+def load_frame(path)->pd.DataFrame:
+    """Load a stored frame, memory-mapping the binary values.
+    Each version of a dataset is read at most once per process (while it stays cached),
+    the returned frame is shared and must not be modified in place."""
+    return _loaded_frames.get(str(Path(path)), path, lambda: _read_frame(path))
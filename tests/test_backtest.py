@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+from backtest import RollingMoments, backtest_report, rebalance_positions, strategies, walk_forward
+from utils import MarketStats
+
+
+def log_returns(n_days:int=400, n_assets:int=4, seed:int=0)->pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range('2020-01-01', periods=n_days, name='Date')
+    return pd.DataFrame(rng.normal(0.0005, 0.01, (n_days, n_assets)), index=index, columns=list('abcd')[:n_assets])
+
+class RecordingOptimizer:
+    """equal weights optimizer remembering the moments it was called with"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, mean, cov):
+        self.calls.append((mean.copy(), cov.copy()))
+        return np.full(len(mean), 1/len(mean))
+
+
+def test_rolling_moments_match_recomputation_after_adds_and_removes():
+    returns = log_returns().values
+    moments = RollingMoments(returns.shape[1])
+    start, end = 0, 0
+    for new_start, new_end in [(0, 30), (0, 75), (10, 75), (40, 120), (119, 200), (150, 230)]:
+        moments.add(returns[end:new_end])
+        moments.remove(returns[start:new_start])
+        start, end = new_start, new_end
+        window = returns[start:end]
+        np.testing.assert_allclose(moments.mean, window.mean(axis=0), atol=1e-15)
+        np.testing.assert_allclose(moments.cov, np.cov(window, rowvar=False), atol=1e-12)
+
+def test_walk_forward_optimizes_on_the_preceding_window():
+    df = log_returns()
+    stats = MarketStats(df)
+    optimizer = RecordingOptimizer()
+    daily, df_weights = walk_forward(stats, optimizer, window=60, freq='M')
+    positions = rebalance_positions(df.index, freq='M', min_history=60)
+    assert list(df_weights.index) == list(df.index[positions])
+    for position, (mean, cov) in zip(positions, optimizer.calls):
+        window = df.values[position - 60:position]
+        np.testing.assert_allclose(mean, window.mean(axis=0), atol=1e-15)
+        np.testing.assert_allclose(cov, np.cov(window, rowvar=False), atol=1e-12)
+    # the daily returns start with the first rebalancing day
+    assert daily.index[0] == df.index[positions[0]] and len(daily) == len(df) - positions[0]
+
+def test_walk_forward_expanding_window_uses_all_days_so_far():
+    df = log_returns()
+    optimizer = RecordingOptimizer()
+    walk_forward(MarketStats(df), optimizer, window=60, expanding=True, freq='Q')
+    for position, (mean, cov) in zip(rebalance_positions(df.index, freq='Q', min_history=60), optimizer.calls):
+        np.testing.assert_allclose(cov, np.cov(df.values[:position], rowvar=False), atol=1e-12)
+
+def test_walk_forward_weights_do_not_look_ahead():
+    df = log_returns()
+    optimizer = strategies(rfr=0.03)['min variance']
+    _, df_weights = walk_forward(MarketStats(df), optimizer, window=60, freq='M')
+    # changing the returns from some rebalancing day on must not change the weights chosen up to that day
+    cut = rebalance_positions(df.index, freq='M', min_history=60)[3]
+    df_changed = df.copy()
+    df_changed.iloc[cut:] = np.random.default_rng(1).normal(0.01, 0.05, df_changed.iloc[cut:].shape)
+    _, df_weights_changed = walk_forward(MarketStats(df_changed), optimizer, window=60, freq='M')
+    pd.testing.assert_frame_equal(df_weights.loc[:df.index[cut]], df_weights_changed.loc[:df.index[cut]])
+    assert not np.allclose(df_weights.values[4:], df_weights_changed.values[4:])
+
+def test_walk_forward_holds_the_weights_until_the_next_rebalancing():
+    df = log_returns(n_assets=2)
+    daily, df_weights = walk_forward(MarketStats(df), RecordingOptimizer(), window=60, freq='M')
+    positions = rebalance_positions(df.index, freq='M', min_history=60)
+    # buy and hold of equal weights over the first period
+    growth = np.exp(np.cumsum(df.values[positions[0]:positions[1]], axis=0)) @ np.full(2, 0.5)
+    np.testing.assert_allclose((1 + daily.iloc[:positions[1] - positions[0]]).cumprod().values, growth)
+
+def test_backtest_report_of_constant_returns():
+    daily = pd.Series(np.full(250, 0.001))
+    report = backtest_report(daily, rfr=0.0, ntd=250)
+    np.testing.assert_allclose(report['annual return'], 1.001**250 - 1)
+    assert report['max drawdown'] == 0
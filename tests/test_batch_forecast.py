@@ -0,0 +1,17 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from batch_forecast import THREAD_VARS, _thread_limits
+
+
+def _worker_thread_vars():
+    return {var: os.environ.get(var) for var in THREAD_VARS}
+
+def test_thread_limits_reach_spawned_workers_and_are_restored(monkeypatch):
+    monkeypatch.setenv('OMP_NUM_THREADS', '8')
+    monkeypatch.delenv('MKL_NUM_THREADS', raising=False)
+    with _thread_limits(2), ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        worker_vars = pool.submit(_worker_thread_vars).result()
+    assert worker_vars == {var: '2' for var in THREAD_VARS}
+    assert os.environ['OMP_NUM_THREADS'] == '8'
+    assert 'MKL_NUM_THREADS' not in os.environ
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+from covariance import (DenseCovariance, FactorCovariance, batch_portfolio_kpis, estimate_covariance, factor_covariance,
+                        ledoit_wolf_covariance, sample_covariance)
+
+
+def returns(n_days:int=300, n_assets:int=20, seed:int=0)->pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    market = rng.normal(0, 0.01, (n_days, 1))
+    betas = rng.uniform(0.5, 1.5, n_assets)
+    return pd.DataFrame(market*betas + rng.normal(0, 0.005, (n_days, n_assets)))
+
+def weights(n:int, k:int, seed:int=1)->np.ndarray:
+    w = np.random.default_rng(seed).random((n, k))
+    return w / w.sum(axis=1, keepdims=True)
+
+
+def test_sample_covariance_matches_pandas():
+    df = returns()
+    np.testing.assert_allclose(sample_covariance(df).matrix, df.cov().values)
+
+def test_factor_model_operations_match_its_dense_matrix():
+    cov = factor_covariance(returns(), n_factors=3)
+    dense = DenseCovariance(cov.matrix)
+    w = weights(50, len(cov))
+    np.testing.assert_allclose(cov.dot(w), dense.dot(w))
+    np.testing.assert_allclose(cov.variances(w), dense.variances(w))
+    np.testing.assert_allclose(cov.row(4), dense.row(4))
+    np.testing.assert_allclose(cov.diag, dense.diag)
+    assert cov.max_eigenvalue() >= dense.max_eigenvalue() - 1e-12
+
+def test_factor_model_keeps_asset_variances_and_approximates_portfolio_variances():
+    df = returns()
+    cov = factor_covariance(df, n_factors=3)
+    np.testing.assert_allclose(cov.diag, df.var().values)
+    w = weights(50, df.shape[1])
+    np.testing.assert_allclose(cov.variances(w), sample_covariance(df).variances(w), rtol=0.05)
+
+def test_ledoit_wolf_is_well_conditioned_with_few_days():
+    df = returns(n_days=25, n_assets=40)
+    assert np.linalg.matrix_rank(sample_covariance(df).matrix) < 40
+    eigenvalues = np.linalg.eigvalsh(ledoit_wolf_covariance(df).matrix)
+    assert eigenvalues[0] > 0
+    assert eigenvalues[-1] / eigenvalues[0] < 1e6
+
+def test_batch_kpis_accept_covariance_models():
+    df = returns()
+    mean = df.mean().values
+    w = weights(10, df.shape[1])
+    dense = batch_portfolio_kpis(w, mean, df.cov().values, rfr=0.03)
+    model = batch_portfolio_kpis(w, mean, sample_covariance(df), rfr=0.03)
+    for expected, actual in zip(dense, model):
+        np.testing.assert_allclose(actual, expected)
+    np.testing.assert_allclose(dense[1], np.sqrt(np.einsum('ij,jk,ik->i', w, df.cov().values, w)*250))
+
+def test_unknown_estimator_is_rejected():
+    assert isinstance(estimate_covariance(returns(), 'factor model'), FactorCovariance)
+    with pytest.raises(ValueError):
+        estimate_covariance(returns(), 'shrunk')
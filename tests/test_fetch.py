@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+from fetch import FetchReport, StubFetcher, drop_sparse_columns, fetch_prices
+from price_cache import LocalFetcher, PriceCache
+
+
+def prices(tickers=('SAP', 'BMW', 'BAS', 'ALV'), n_days:int=200)->pd.DataFrame:
+    index = pd.bdate_range('2020-01-01', periods=n_days, name='Date')
+    return pd.DataFrame({ticker: np.linspace(10 + i, 20 + i, n_days) for i, ticker in enumerate(tickers)}, index=index)
+
+class FailingFirstFetcher(StubFetcher):
+    """fails the first n_failures requests of every ticker"""
+
+    def __init__(self, df, n_failures:int):
+        super().__init__(df)
+        self.n_failures = n_failures
+        self.calls = {}
+
+    def fetch(self, ticker, start, end):
+        self.calls[ticker] = self.calls.get(ticker, 0) + 1
+        if self.calls[ticker] <= self.n_failures:
+            raise ConnectionError('injected failure fetching ' + ticker)
+        return super().fetch(ticker, start, end)
+
+
+def test_all_tickers_fetched_in_requested_order(tmp_path):
+    df = prices()
+    cache = PriceCache(tmp_path, StubFetcher(df, latency=0.01))
+    tickers = ['ALV', 'SAP', 'BMW']
+    df_fetched, report = fetch_prices(tickers, '2020-01-01', '2020-06-01', cache, max_workers=3, backoff=0)
+    assert list(df_fetched.columns) == tickers
+    assert report.ok and report.fetched == tickers
+    assert report.attempts == {ticker: 1 for ticker in tickers}
+
+def test_transient_failures_are_retried(tmp_path):
+    cache = PriceCache(tmp_path, FailingFirstFetcher(prices(), n_failures=2))
+    df_fetched, report = fetch_prices(['SAP', 'BMW'], '2020-01-01', '2020-06-01', cache, retries=2, backoff=0)
+    assert report.ok
+    assert report.attempts == {'SAP': 3, 'BMW': 3}
+    assert df_fetched.notna().all().all()
+
+def test_permanent_failures_are_reported(tmp_path):
+    cache = PriceCache(tmp_path, StubFetcher(prices(), failing_tickers=['BMW']))
+    df_fetched, report = fetch_prices(['SAP', 'BMW'], '2020-01-01', '2020-06-01', cache, retries=1, backoff=0)
+    assert list(df_fetched.columns) == ['SAP']
+    assert report.fetched == ['SAP']
+    assert list(report.failed) == ['BMW'] and 'injected failure' in report.failed['BMW']
+    assert report.attempts['BMW'] == 2
+    assert not report.ok
+
+def test_failed_gap_is_retried_and_reported_as_partial(tmp_path):
+    df = prices()
+    # the first months are cached already, only the gap after them is requested
+    PriceCache(tmp_path, LocalFetcher(df)).get('SAP', '2020-01-01', '2020-03-01')
+    cache = PriceCache(tmp_path, StubFetcher(df, failing_tickers=['SAP']))
+    df_fetched, report = fetch_prices(['SAP'], '2020-01-01', '2020-06-01', cache, retries=2, backoff=0)
+    assert report.attempts['SAP'] == 3
+    assert list(report.partial) == ['SAP'] and not report.failed
+    assert df_fetched.index.max() < pd.Timestamp('2020-03-01')
+    # a later download fetches the missing gap
+    df_fetched, report = fetch_prices(['SAP'], '2020-01-01', '2020-06-01', PriceCache(tmp_path, LocalFetcher(df)), backoff=0)
+    assert report.ok and df_fetched.index.max() == df.index[df.index < '2020-06-01'].max()
+
+def test_progress_callback(tmp_path):
+    cache = PriceCache(tmp_path, StubFetcher(prices(), failing_tickers=['BAS']))
+    calls = []
+    fetch_prices(['SAP', 'BMW', 'BAS'], '2020-01-01', '2020-06-01', cache, retries=0, backoff=0,
+                 on_progress=lambda n_done, n_total, ticker, error: calls.append((n_done, n_total, ticker, error is not None)))
+    assert [call[:2] for call in calls] == [(1, 3), (2, 3), (3, 3)]
+    assert sorted((ticker, failed) for _, _, ticker, failed in calls) == [('BAS', True), ('BMW', False), ('SAP', False)]
+
+def test_drop_sparse_columns():
+    df = prices(n_days=100)
+    df.loc[df.index[10:], 'BMW'] = np.nan
+    report = FetchReport()
+    kept = drop_sparse_columns(df, '2020-01-01', '2020-05-01', na_percentage=0.5, report=report)
+    assert 'BMW' not in kept.columns and report.dropped == ['BMW']
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('neuralprophet')
+
+from neuralprophet import NeuralProphet, set_random_seed
+from utils import _forecast_frame, refresh_forecast
+
+
+def _prices(n_days=1200, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2018-01-01', periods=n_days, freq='D')
+    t = np.arange(n_days)
+    prices = 100 + 0.05*t + 5*np.sin(2*np.pi*t/365.25) + rng.normal(0, 1, n_days)
+    return pd.DataFrame({'AAA': prices}, index=dates)
+
+def _fit(df_stock, epochs=40):
+    # two unseeded full fits differ by a few percent themselves
+    set_random_seed(0)
+    m = NeuralProphet(n_forecasts=1, n_lags=0, epochs=epochs)
+    m.fit(df_stock)
+    future = m.make_future_dataframe(df=df_stock, periods=365, n_historic_predictions=len(df_stock))
+    return m, m.predict(future)
+
+def test_refresh_keeps_fitted_normalization_and_seasonality():
+    df_stock = _forecast_frame(_prices(), 'AAA')
+    n_fitted = len(df_stock) - 30
+    m, forecast = _fit(df_stock.iloc[:n_fitted])
+    data_params = m.config_normalization.global_data_params['y']
+    shift, scale = data_params.shift, data_params.scale
+    seasonalities = set(m.season_config.periods)
+
+    refreshed = refresh_forecast(m, forecast, df_stock, n_fitted)
+
+    assert (data_params.shift, data_params.scale) == (shift, scale)
+    assert m.config_normalization.global_data_params['y'] is data_params
+    assert set(m.season_config.periods) == seasonalities
+    assert '_init_train_loader' not in vars(m)
+    assert len(refreshed) == len(df_stock) + 365
+    assert refreshed['ds'].is_monotonic_increasing
+
+def test_refresh_stays_close_to_full_refit():
+    df = _prices()
+    df_stock = _forecast_frame(df, 'AAA')
+    n_fitted = len(df_stock) - 30
+    m, forecast = _fit(df_stock.iloc[:n_fitted])
+    set_random_seed(0)
+    refreshed = refresh_forecast(m, forecast, df_stock, n_fitted)
+    _, refit = _fit(df_stock)
+
+    merged = refreshed.merge(refit, on='ds', suffixes=('_refreshed', '_refit'))
+    assert len(merged) == len(df_stock) + 365
+    # compare new days and forecast horizon relative to the range of the prices
+    new = merged[merged['ds'] > df_stock['ds'].iloc[n_fitted - 1]]
+    error = np.abs(new['yhat1_refreshed'] - new['yhat1_refit']).mean() / np.ptp(df['AAA'])
+    assert error < 0.05
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+import forecast_store
+from forecast_store import ForecastCache, series_fingerprint
+
+torch = pytest.importorskip('torch')
+
+
+def series(n_days:int)->pd.Series:
+    index = pd.bdate_range('2020-01-01', periods=n_days, name='Date')
+    return pd.Series(np.linspace(100, 120, n_days), index=index, name='SAP')
+
+def forecast(n_days:int)->pd.DataFrame:
+    return pd.DataFrame({'ds': pd.bdate_range('2020-01-01', periods=n_days), 'yhat1': np.arange(n_days, dtype=float)})
+
+
+def test_get_returns_stored_entry(tmp_path):
+    cache = ForecastCache(tmp_path)
+    cache.put('SAP', series(50), torch.nn.Linear(2, 1), forecast(50))
+    model, stored = cache.get('SAP', series(50))
+    assert isinstance(model, torch.nn.Linear)
+    pd.testing.assert_frame_equal(stored, forecast(50))
+    assert cache.get('SAP', series(51)) is None
+    assert cache.has('SAP', series(50)) and not cache.has('SAP', series(51))
+    assert not list(tmp_path.glob('*.tmp'))
+
+def test_get_prefix_finds_longest_fitted_prefix(tmp_path):
+    cache = ForecastCache(tmp_path)
+    full = series(45)
+    cache.put('SAP', full.iloc[:30], torch.nn.Linear(2, 1), forecast(30))
+    cache.put('SAP', full.iloc[:40], torch.nn.Linear(2, 1), forecast(40))
+    model, stored, length = cache.get_prefix('SAP', full)
+    assert length == 40 and len(stored) == 40
+    # a changed history is no prefix
+    assert cache.get_prefix('SAP', series(45)*2) is None
+    assert cache.get_prefix('BMW', full) is None
+
+def test_unreadable_entry_is_a_miss_and_dropped(tmp_path):
+    cache = ForecastCache(tmp_path)
+    cache.put('SAP', series(50), torch.nn.Linear(2, 1), forecast(50))
+    key = cache.key('SAP', series_fingerprint(series(50)))
+    model_path, _ = cache._paths(key)
+    model_path.write_bytes(b'not a model')
+    assert cache.get('SAP', series(50)) is None
+    assert key not in cache._read_index()
+    assert not model_path.exists()
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ForecastCache(tmp_path, max_bytes=1)
+    cache.put('SAP', series(30), torch.nn.Linear(2, 1), forecast(30))
+    cache.put('BMW', series(30), torch.nn.Linear(2, 1), forecast(30))
+    assert not cache.has('SAP', series(30))
+    assert cache.get('SAP', series(30)) is None
+    assert cache.get('BMW', series(30)) is not None
+
+def test_preload_keeps_most_recent_entries_in_memory(tmp_path, monkeypatch):
+    cache = ForecastCache(tmp_path)
+    full = series(60)
+    for n_days in (30, 40, 50):
+        cache.put('SAP', full.iloc[:n_days], torch.nn.Linear(2, 1), forecast(n_days))
+    assert cache.preload(2) == 2
+    loaded = [key for cachedir, key in forecast_store._loaded_entries if cachedir == str(tmp_path)]
+    assert sorted(loaded) == sorted(cache.key('SAP', series_fingerprint(full.iloc[:n_days])) for n_days in (40, 50))
+    # preloaded entries are served from memory
+    def fail(path):
+        raise AssertionError('loaded from disk')
+    monkeypatch.setattr(forecast_store, '_load_model', fail)
+    model, _ = cache.get('SAP', full.iloc[:50])
+    monkeypatch.undo()
+    # fine-tuning gets a private copy of the model
+    prefix_model, _, length = cache.get_prefix('SAP', full)
+    assert length == 50 and prefix_model is not model
@@ -0,0 +1,39 @@
+import numpy as np
+from utils import FrontierIndex, SimulationResults, min_variance_portfolio
+
+
+def sorted_simulation(n:int=2000, seed:int=0)->SimulationResults:
+    rng = np.random.default_rng(seed)
+    weights = rng.random((n, 3))
+    weights /= weights.sum(axis=1, keepdims=True)
+    returns = rng.normal(0.0005, 0.0002, n)
+    stds = rng.uniform(0.1, 0.4, n)
+    results = SimulationResults.from_arrays(weights, returns, stds, returns / stds, ['a', 'b', 'c'])
+    results.sort_by_std()
+    return results
+
+def test_best_under_matches_brute_force():
+    results = sorted_simulation()
+    frontier = FrontierIndex.from_sorted(results.stds, results.returns)
+    for max_risk in np.linspace(0.05, 0.45, 41):
+        row = frontier.best_under(max_risk)
+        below = results.stds <= max_risk
+        if not below.any():
+            assert row is None
+            continue
+        assert results.stds[row] <= max_risk
+        assert results.returns[row] == results.returns[below].max()
+
+def test_min_variance_row():
+    results = sorted_simulation()
+    frontier = FrontierIndex.from_sorted(results.stds, results.returns)
+    np.testing.assert_array_equal(min_variance_portfolio(results.df, ['a', 'b', 'c'], frontier=frontier),
+                                  min_variance_portfolio(results))
+    np.testing.assert_array_equal(min_variance_portfolio(results, frontier=frontier), min_variance_portfolio(results))
+
+def test_round_trip_through_dataframe():
+    results = sorted_simulation(n=100)
+    frontier = FrontierIndex.from_sorted(results.stds, results.returns)
+    restored = FrontierIndex.from_df(frontier.to_df(), results.df)
+    np.testing.assert_array_equal(restored.frontier_rows, frontier.frontier_rows)
+    assert restored.best_under(0.3) == frontier.best_under(0.3)
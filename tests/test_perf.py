@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+import threading
+import tracemalloc
+from pathlib import Path
+import perf
+
+
+def test_disable_stops_the_memory_tracking_started_by_enable():
+    assert not tracemalloc.is_tracing()
+    perf.enable(memory=True)
+    try:
+        assert tracemalloc.is_tracing()
+        with perf.stage('allocate'):
+            data = bytearray(10**6)
+        assert perf.records()[-1]['peak_bytes'] >= 10**6
+    finally:
+        perf.disable()
+        perf.reset()
+    assert not tracemalloc.is_tracing()
+
+def test_memory_tracking_runs_while_any_thread_uses_it():
+    perf.enable(memory=True)
+    def other_thread():
+        perf.enable(memory=True)
+        perf.disable()
+    thread = threading.Thread(target=other_thread)
+    thread.start()
+    thread.join()
+    assert tracemalloc.is_tracing()
+    perf.disable()
+    assert not tracemalloc.is_tracing()
+
+def test_tracing_started_elsewhere_is_left_running():
+    tracemalloc.start()
+    try:
+        perf.enable(memory=True)
+        perf.disable()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+def test_environment_enabled_instrumentation_logs_without_enable():
+    code = 'from perf import stage\nwith stage("step"):\n    pass\n'
+    env = dict(os.environ, PERF_INSTRUMENTATION='1')
+    result = subprocess.run([sys.executable, '-c', code], cwd=Path(__file__).resolve().parents[1], env=env,
+                            capture_output=True, text=True, check=True)
+    assert '"stage": "step"' in result.stderr
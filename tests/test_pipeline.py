@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pytest
+import batch_forecast
+from fetch import StubFetcher
+from forecast_store import ForecastCache
+from pipeline import Pipeline, load_simulation, run_simulation, run_swarm, stream_simulation
+from storage import load_frame, save_frame
+from workspace import session_dataset, session_simulation, simulation_key
+
+
+def prices()->pd.DataFrame:
+    index = pd.bdate_range('2020-01-01', periods=60, name='Date')
+    return pd.DataFrame({'SAP': np.linspace(100, 120, 60), 'BMW': np.linspace(80, 70, 60)}, index=index)
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    torch = pytest.importorskip('torch')
+    runs = []
+    def forecast_all(datapath, modelpath, **kwargs):
+        runs.append(1)
+        cache = ForecastCache(modelpath)
+        for stock, series in prices().items():
+            cache.put(stock, series, torch.nn.Linear(2, 1), pd.DataFrame({'yhat1': series.values}))
+        return {}
+    monkeypatch.setattr(batch_forecast, 'forecast_all', forecast_all)
+    pipeline = Pipeline(tmp_path / 'data', tmp_path / 'models', fetcher=object(), log=lambda message: None)
+    save_frame(prices(), pipeline.datapath / 'data')
+    return pipeline, runs
+
+def test_forecast_step_is_skipped_while_all_models_are_stored(pipeline):
+    pipeline, runs = pipeline
+    pipeline.forecast('stamp')
+    pipeline.forecast('stamp')
+    assert len(runs) == 1
+
+def test_forecast_step_reruns_after_a_model_was_evicted(pipeline):
+    pipeline, runs = pipeline
+    pipeline.forecast('stamp')
+    cache = ForecastCache(pipeline.modelpath)
+    for key in list(cache._read_index()):
+        if key.startswith('BMW'):
+            cache._drop(key)
+    pipeline.forecast('stamp')
+    assert len(runs) == 2
+
+def test_simulation_is_preallocated_for_all_portfolios():
+    df_returns = prices().pct_change().dropna()
+    buffers = {id(results._data) for results in stream_simulation(df_returns, 25000, rfr=0.03, chunk_size=10000, seed=0)}
+    assert len(buffers) == 1
+    results = run_simulation(df_returns, 25000, rfr=0.03, seed=0)
+    assert len(results) == 25000 and len(results._data) == 25000
+
+def test_simulation_is_published_to_the_workspace_store(tmp_path):
+    pipeline = Pipeline(tmp_path / 'data', tmp_path / 'models', fetcher=object(), log=lambda message: None)
+    save_frame(prices(), pipeline.datapath / 'data')
+    returns_stamp = pipeline.returns('stamp')
+    pipeline.simulate(returns_stamp, 100, 0.03, seed=0)
+
+    # a page session without a simulation of its own finds the pipeline´s one for its dataset
+    session_state = {}
+    dataset_version = session_dataset(session_state, pipeline.store, legacy_path=pipeline.datapath / 'data')
+    version = session_simulation(session_state, pipeline.store, dataset_version, 'sample', 'monte-carlo')
+    assert version == pipeline.store.lookup(simulation_key(dataset_version, 'sample', 'monte-carlo', 100, 0.03))
+    df_simulation, frontier = load_simulation(pipeline.store.path(version))
+    assert len(df_simulation) == 100
+
+    logged = []
+    pipeline.log = logged.append
+    pipeline.simulate(returns_stamp, 100, 0.03, seed=0)
+    assert logged == ['simulate: up to date']
+    # the step runs again once its version was garbage-collected
+    pipeline.store.collect_garbage(max_age=-1)
+    pipeline.simulate(returns_stamp, 100, 0.03, seed=0)
+    assert logged[-1] == 'simulate: done'
+
+def test_download_runs_again_until_all_tickers_are_fetched(tmp_path):
+    fetcher = StubFetcher(prices(), failing_tickers=['BMW'])
+    logged = []
+    pipeline = Pipeline(tmp_path / 'data', tmp_path / 'models', fetcher=fetcher, log=logged.append)
+    first_stamp = pipeline.download(['SAP', 'BMW'], '2020-01-01', '2020-03-31')
+    assert any('failed to download BMW' in message for message in logged)
+
+    fetcher.failing_tickers.clear()
+    logged.clear()
+    second_stamp = pipeline.download(['SAP', 'BMW'], '2020-01-01', '2020-03-31')
+    assert 'download: up to date' not in logged
+    assert list(load_frame(pipeline.datapath / 'data').columns) == ['SAP', 'BMW']
+    # the returns are computed again from the completed data
+    assert second_stamp != first_stamp
+
+    logged.clear()
+    assert pipeline.download(['SAP', 'BMW'], '2020-01-01', '2020-03-31') == second_stamp
+    assert logged == ['download: up to date']
+
+def test_swarm_is_reproducible_with_a_seed():
+    df_returns = prices().pct_change().dropna()
+    df_returns['VW'] = np.random.default_rng(0).normal(0, 0.01, len(df_returns))
+    weights = [run_swarm(df_returns, 0.03, 0.5, seed=0) for _ in range(2)]
+    np.testing.assert_array_equal(weights[0], weights[1])
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('plotly')
+
+from plotting import _bin_quotas, stratified_sample
+
+
+def test_bin_quotas_pass_the_share_of_sparse_bins_on():
+    quotas = _bin_quotas(np.array([0, 3, 100, 50, 0]), 60)
+    assert quotas.sum() == 60
+    assert quotas[1] == 3 and quotas[0] == quotas[4] == 0
+    assert abs(quotas[2] - quotas[3]) <= 1
+
+def test_sample_of_a_concentrated_cloud_keeps_the_full_budget_and_the_outliers():
+    rng = np.random.default_rng(0)
+    stds = np.r_[rng.normal(0.2, 0.01, 1_000_000), [0.9, 1.5, 3.0]]
+    rows = stratified_sample(stds, max_points=5000)
+    assert len(rows) == 5000 and len(np.unique(rows)) == 5000
+    assert np.all(np.diff(rows) > 0)
+    assert np.isin([1_000_000, 1_000_001, 1_000_002], rows).all()
+
+def test_small_simulations_are_not_sampled():
+    np.testing.assert_array_equal(stratified_sample(np.linspace(0, 1, 100), max_points=5000), np.arange(100))
@@ -0,0 +1,99 @@
+import sys
+import types
+import numpy as np
+import pandas as pd
+import pytest
+from price_cache import LocalFetcher, PriceCache, YahooFetcher, _merge_ranges, _missing_ranges
+
+
+def ts(day:str)->pd.Timestamp:
+    return pd.Timestamp(day)
+
+def prices(n_days:int=300)->pd.DataFrame:
+    index = pd.bdate_range('2020-01-01', periods=n_days, name='Date')
+    return pd.DataFrame({'SAP': np.linspace(100, 130, n_days), 'BMW': np.linspace(50, 40, n_days)}, index=index)
+
+class CountingFetcher(LocalFetcher):
+    """local fetcher recording every requested range"""
+
+    def __init__(self, df):
+        super().__init__(df)
+        self.requests = []
+
+    def fetch(self, ticker, start, end):
+        self.requests.append((ticker, start, end))
+        return super().fetch(ticker, start, end)
+
+class FailingOnceFetcher(CountingFetcher):
+    """returns an empty series on the first request, like yfinance on a transient error"""
+
+    def fetch(self, ticker, start, end):
+        series = super().fetch(ticker, start, end)
+        return series.iloc[:0] if len(self.requests) == 1 else series
+
+
+def test_merge_ranges():
+    ranges = [(ts('2020-03-01'), ts('2020-04-01')), (ts('2020-01-01'), ts('2020-02-01')), (ts('2020-02-01'), ts('2020-02-15')),
+              (ts('2020-03-15'), ts('2020-03-20'))]
+    assert _merge_ranges(ranges) == [(ts('2020-01-01'), ts('2020-02-15')), (ts('2020-03-01'), ts('2020-04-01'))]
+    assert _merge_ranges([]) == []
+
+def test_missing_ranges():
+    covered = [(ts('2020-02-01'), ts('2020-03-01')), (ts('2020-04-01'), ts('2020-05-01'))]
+    assert _missing_ranges(ts('2020-01-01'), ts('2020-06-01'), covered) == [
+        (ts('2020-01-01'), ts('2020-02-01')), (ts('2020-03-01'), ts('2020-04-01')), (ts('2020-05-01'), ts('2020-06-01'))]
+    assert _missing_ranges(ts('2020-02-10'), ts('2020-02-20'), covered) == []
+    assert _missing_ranges(ts('2020-01-01'), ts('2020-01-10'), []) == [(ts('2020-01-01'), ts('2020-01-10'))]
+
+def test_only_gaps_are_fetched(tmp_path):
+    df = prices()
+    fetcher = CountingFetcher(df)
+    cache = PriceCache(tmp_path, fetcher)
+    first = cache.get('SAP', '2020-02-01', '2020-06-01')
+    assert len(fetcher.requests) == 1
+    # a wider range only requests the parts before and after the cached range (which ends after the last business day)
+    series = cache.get('SAP', '2020-01-01', '2020-08-01')
+    assert fetcher.requests[1:] == [('SAP', ts('2020-01-01'), ts('2020-02-01')), ('SAP', ts('2020-05-30'), ts('2020-08-01'))]
+    expected = df['SAP'][(df.index >= '2020-01-01') & (df.index < '2020-08-01')]
+    np.testing.assert_allclose(series.values, expected.values)
+    assert series.index.equals(expected.index)
+    # a cached range is served without fetching
+    pd.testing.assert_series_equal(cache.get('SAP', '2020-02-01', '2020-06-01'), first, check_freq=False)
+    assert len(fetcher.requests) == 3
+
+def test_empty_answer_is_not_marked_covered(tmp_path):
+    fetcher = FailingOnceFetcher(prices())
+    cache = PriceCache(tmp_path, fetcher)
+    assert len(cache.get('SAP', '2020-03-02', '2020-03-07')) == 0
+    assert cache.coverage('SAP') == []
+    assert len(cache.get('SAP', '2020-03-02', '2020-03-07')) == 5
+    assert len(fetcher.requests) == 2
+
+def test_coverage_ends_at_last_returned_day(tmp_path):
+    df = prices()
+    cache = PriceCache(tmp_path, CountingFetcher(df))
+    cache.get('SAP', '2020-01-01', '2030-01-01')
+    last_day = df.index[-1]
+    assert cache.coverage('SAP') == [(ts('2020-01-01'), last_day + pd.Timedelta(days=1))]
+
+class FakeTicker:
+    """stand-in for yfinance.Ticker answering history requests from a frame (or raising like raise_errors=True)"""
+    error = None
+
+    def __init__(self, ticker):
+        self.ticker = ticker
+
+    def history(self, start=None, end=None, auto_adjust=True, actions=True, raise_errors=False, debug=True):
+        if FakeTicker.error is not None:
+            raise FakeTicker.error
+        index = pd.date_range(start, end, freq='B', inclusive='left', tz='America/New_York', name='Date')
+        return pd.DataFrame({'Close': np.arange(len(index), dtype=float), 'Adj Close': 0.0}, index=index)
+
+def test_yahoo_fetcher_uses_per_ticker_history(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'yfinance', types.SimpleNamespace(Ticker=FakeTicker))
+    close = YahooFetcher().fetch('SAP', pd.Timestamp('2020-01-01'), pd.Timestamp('2020-01-15'))
+    assert close.name == 'SAP' and close.index.tz is None
+    assert close.index[0] == pd.Timestamp('2020-01-01') and len(close) == 10
+    monkeypatch.setattr(FakeTicker, 'error', RuntimeError('No data found, symbol may be delisted'))
+    with pytest.raises(ConnectionError):
+        YahooFetcher().fetch('SAP', pd.Timestamp('2020-01-01'), pd.Timestamp('2020-01-15'))
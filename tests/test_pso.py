@@ -0,0 +1,52 @@
+import time
+import numpy as np
+from pso import pso
+
+
+def sphere(x:np.ndarray)->np.ndarray:
+    """batched objective with its minimum 0 at (0.3, -0.2, 0.5)"""
+    return np.sum((x - np.array([0.3, -0.2, 0.5]))**2, axis=1)
+
+class CountingObjective:
+    """batched objective counting the swarm evaluations"""
+
+    def __init__(self, func):
+        self.func = func
+        self.n_calls = 0
+
+    def __call__(self, x):
+        self.n_calls += 1
+        return self.func(x)
+
+
+def test_finds_the_minimum_of_a_batched_function():
+    g, fg = pso(sphere, [-1, -1, -1], [1, 1, 1], maxiter=200, minfunc=0, minstep=0, seed=0)
+    np.testing.assert_allclose(g, [0.3, -0.2, 0.5], atol=1e-3)
+    assert fg < 1e-6
+
+def test_same_seed_gives_identical_results():
+    first = pso(sphere, [-1, -1, -1], [1, 1, 1], seed=42)
+    second = pso(sphere, [-1, -1, -1], [1, 1, 1], seed=42)
+    np.testing.assert_array_equal(first[0], second[0])
+    assert first[1] == second[1]
+
+def test_stops_after_patience_iterations_without_improvement():
+    # a constant objective never improves: one initial evaluation plus patience iterations
+    objective = CountingObjective(lambda x: np.zeros(len(x)))
+    pso(objective, [0, 0], [1, 1], maxiter=100, patience=5, seed=0)
+    assert objective.n_calls == 1 + 5
+
+def test_respects_the_time_budget():
+    def slow(x):
+        time.sleep(0.02)
+        return np.zeros(len(x))
+    t_start = time.perf_counter()
+    pso(slow, [0, 0], [1, 1], maxiter=1000, time_budget=0.2, seed=0)
+    # at most one iteration beyond the budget
+    assert time.perf_counter() - t_start < 0.2 + 0.1
+
+def test_stays_within_bounds_and_keeps_the_start_position():
+    g, fg = pso(sphere, [0.4, 0, 0.6], [1, 1, 1], x0=[0.4, 0, 0.6], maxiter=0, seed=0)
+    assert fg <= sphere(np.array([[0.4, 0, 0.6]]))[0]
+    g, _ = pso(sphere, [0.4, 0, 0.6], [1, 1, 1], seed=0)
+    assert np.all(g >= [0.4, 0, 0.6]) and np.all(g <= 1)
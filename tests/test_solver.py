@@ -0,0 +1,54 @@
+import numpy as np
+from covariance import batch_portfolio_kpis, portfolio_stds
+from solver import efficient_frontier, max_return_under_risk, max_sharp_ratio, project_simplex, solve_tradeoff
+
+
+def market(k:int=6, seed:int=0):
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0004, 0.01, (1000, k)) + rng.normal(0, 0.005, (1000, 1))
+    return returns.mean(axis=0), np.cov(returns, rowvar=False)
+
+def random_portfolios(k:int, n:int=20000, seed:int=1)->np.ndarray:
+    return np.random.default_rng(seed).dirichlet(np.ones(k), n)
+
+
+def test_project_simplex():
+    V = np.random.default_rng(0).normal(size=(100, 5))*3
+    P = project_simplex(V)
+    np.testing.assert_allclose(P.sum(axis=1), 1)
+    assert (P >= 0).all()
+    # points on the simplex are kept, and the projection is the closest point among random simplex points
+    np.testing.assert_allclose(project_simplex(P), P, atol=1e-12)
+    candidates = random_portfolios(5, n=5000)
+    for v, p in zip(V[:10], P[:10]):
+        assert np.linalg.norm(v - p) <= np.min(np.linalg.norm(candidates - v, axis=1)) + 1e-9
+    np.testing.assert_allclose(project_simplex(np.array([0.5, 0.5, 2.0])), [[0, 0, 1]])
+
+def test_min_variance_two_assets():
+    cov = np.array([[0.04, 0.01], [0.01, 0.09]])
+    w = solve_tradeoff(np.zeros(2), cov, 0.0)[0]
+    # closed form of the unconstrained minimum variance portfolio, interior here
+    expected = np.linalg.solve(cov, np.ones(2))
+    np.testing.assert_allclose(w, expected / expected.sum(), atol=1e-6)
+
+def test_max_return_under_risk_beats_random_portfolios():
+    mean, cov = market()
+    W_random = random_portfolios(len(mean))
+    returns, stds, _ = batch_portfolio_kpis(W_random, mean, cov, rfr=0.0)
+    for max_risk in np.quantile(stds, [0.05, 0.3, 0.7]):
+        w = max_return_under_risk(mean, cov, max_risk)[0][0]
+        assert portfolio_stds(w, cov)[0] <= max_risk + 1e-6
+        assert w @ mean >= returns[stds <= max_risk].max() - 1e-9
+
+def test_efficient_frontier_is_increasing():
+    mean, cov = market()
+    W, _ = efficient_frontier(mean, cov, n_points=20)
+    np.testing.assert_allclose(W.sum(axis=1), 1)
+    assert np.all(np.diff(W @ mean) >= -1e-9)
+    assert np.all(np.diff(portfolio_stds(W, cov)) >= -1e-6)
+
+def test_max_sharp_ratio_beats_random_portfolios():
+    mean, cov = market()
+    w = max_sharp_ratio(mean, cov, rfr=0.03)
+    sharp_ratio = batch_portfolio_kpis(w[None, :], mean, cov, rfr=0.03)[2][0]
+    assert sharp_ratio >= batch_portfolio_kpis(random_portfolios(len(mean)), mean, cov, rfr=0.03)[2].max() - 1e-6
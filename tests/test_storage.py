@@ -0,0 +1,55 @@
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+from storage import FrameCache, frame_exists, load_frame, save_frame
+
+
+def test_round_trip_datetime_index(tmp_path):
+    df = pd.DataFrame({'a': [1.0, 2.0, np.nan], 'b': [4.0, 5.0, 6.0]}, index=pd.bdate_range('2020-01-01', periods=3, name='Date'))
+    save_frame(df, tmp_path / 'data')
+    pd.testing.assert_frame_equal(load_frame(tmp_path / 'data'), df, check_freq=False)
+
+def test_round_trip_range_and_string_index(tmp_path):
+    df = pd.DataFrame({'x': [1.0, 2.0]})
+    save_frame(df, tmp_path / 'range')
+    pd.testing.assert_frame_equal(load_frame(tmp_path / 'range'), df, check_index_type=False)
+    df = pd.DataFrame({'x': [1.0, 2.0]}, index=pd.Index(['SAP', 'BMW'], name='stock'))
+    save_frame(df, tmp_path / 'strings')
+    loaded = load_frame(tmp_path / 'strings')
+    assert list(loaded.index) == ['SAP', 'BMW']
+    assert loaded.index.name == 'stock'
+
+def test_rejects_object_index(tmp_path):
+    df = pd.DataFrame({'x': [1.0, 2.0]}, index=pd.Index([('a', 1), ('b', 2)], tupleize_cols=False))
+    with pytest.raises(TypeError):
+        save_frame(df, tmp_path / 'objects')
+    assert not frame_exists(tmp_path / 'objects')
+
+def test_reload_after_save(tmp_path):
+    save_frame(pd.DataFrame({'x': [1.0]}), tmp_path / 'data')
+    save_frame(pd.DataFrame({'x': [1.0, 2.0]}), tmp_path / 'data')
+    assert len(load_frame(tmp_path / 'data')) == 2
+
+def test_concurrent_writers_leave_no_temporary_files(tmp_path):
+    def write(n):
+        for _ in range(20):
+            save_frame(pd.DataFrame({'x': np.arange(n, dtype=float)}), tmp_path / 'shared')
+    threads = [threading.Thread(target=write, args=(n,)) for n in (10, 20, 30)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(load_frame(tmp_path / 'shared')) in (10, 20, 30)
+    assert not list(tmp_path.glob('*.tmp'))
+
+def test_frame_cache_is_bounded_and_drops_deleted_frames(tmp_path):
+    cache = FrameCache(max_entries=2)
+    for name in ('a', 'b', 'c'):
+        save_frame(pd.DataFrame({'x': [1.0, 2.0]}), tmp_path / name)
+        cache.get(name, tmp_path / name, lambda: name)
+    assert len(cache) == 2 and list(cache._entries) == ['b', 'c']
+    for path in tmp_path.glob('b.*'):
+        path.unlink()
+    assert cache.get('c', tmp_path / 'c', lambda: 'rebuilt') == 'c'
+    assert list(cache._entries) == ['c']
@@ -0,0 +1,27 @@
+import pandas as pd
+from storage import save_frame
+from workspace import DatasetStore, pipeline_simulation_key, session_simulation, set_session_simulation
+
+
+def commit_frame(store:DatasetStore, value:float)->str:
+    return store.commit(lambda path: save_frame(pd.DataFrame({'x': [value]}), path / 'data'))
+
+def test_session_simulations_are_kept_per_estimator_and_mode(tmp_path):
+    store = DatasetStore(tmp_path)
+    dataset_version = commit_frame(store, 0.0)
+    sample_version, factor_version = commit_frame(store, 1.0), commit_frame(store, 2.0)
+    session_state = {}
+    set_session_simulation(session_state, dataset_version, 'sample', 'monte-carlo', sample_version)
+    set_session_simulation(session_state, dataset_version, 'factor model', 'monte-carlo', factor_version)
+    assert session_simulation(session_state, store, dataset_version, 'sample', 'monte-carlo') == sample_version
+    assert session_simulation(session_state, store, dataset_version, 'factor model', 'monte-carlo') == factor_version
+    assert session_simulation(session_state, store, dataset_version, 'ledoit-wolf', 'monte-carlo') is None
+    assert session_simulation(session_state, store, dataset_version, 'sample', 'exact') is None
+
+def test_session_without_simulation_gets_the_pipeline_one(tmp_path):
+    store = DatasetStore(tmp_path)
+    dataset_version = commit_frame(store, 0.0)
+    pipeline_version = commit_frame(store, 1.0)
+    store.set_ref(pipeline_simulation_key(dataset_version, 'ledoit-wolf', 'exact'), pipeline_version)
+    assert session_simulation({}, store, dataset_version, 'ledoit-wolf', 'exact') == pipeline_version
+    assert session_simulation({}, store, dataset_version, 'sample', 'exact') is None
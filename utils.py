@@ -1,7 +1,13 @@
+import logging
 import numpy as np
 import pandas as pd
-from neuralprophet import NeuralProphet
-import streamlit as st
+from covariance import NTD, batch_portfolio_kpis, estimate_covariance, portfolio_stds
+from forecast_store import ForecastCache
+from perf import timed
+from storage import FrameCache, load_frame
+
+
+logger = logging.getLogger('utils')
 
 
 #####################################################
@@ -14,21 +20,72 @@ def find_stock_name(asset_mapping:dict, stock_ticker:str)->str:
         if val == stock_ticker:
             return key
 
+# fill missing prices
+def fill_missing_prices(df):
+    """interpolate gaps of up to 7 days in time and backfill the leading values"""
+    return df.interpolate(method='time', limit=7).fillna(value=None, method='bfill', axis=0, inplace=False, limit=7, downcast=None)
+
 # normalized daily returns
+@timed()
 def normalized_returns(df):
     return np.log(1 + df.pct_change(periods=1).fillna(value=None, method='bfill', axis=0, inplace=False, limit=7, downcast=None)) 
 
+class MarketStats:
+    """Market statistics of a price panel computed once: normalized daily log-returns as float64 array,
+    their mean vector, the covariance model of the chosen estimator (see covariance.ESTIMATORS) 
+    and the annualization constant (number of trading days).
+    Can be passed wherever a returns dataframe is expected by the portfolio and simulator functions."""
+
+    def __init__(self, df_returns:pd.DataFrame, ntd:int=NTD, estimator:str='sample'):
+        self.returns = np.ascontiguousarray(df_returns.values, dtype=np.float64)
+        self.index = df_returns.index
+        self.columns = list(df_returns.columns)
+        self.mean = df_returns.mean().values
+        self.cov = estimate_covariance(df_returns, estimator)
+        self.estimator = estimator
+        self.ntd = ntd
+
+    @classmethod
+    def from_prices(cls, df:pd.DataFrame, ntd:int=NTD, estimator:str='sample'):
+        return cls(normalized_returns(df), ntd=ntd, estimator=estimator)
+
+    @property
+    def df_returns(self)->pd.DataFrame:
+        """daily returns as dataframe sharing memory with the stats (no copy)"""
+        return pd.DataFrame(self.returns, index=self.index, columns=self.columns, copy=False)
+
+# market stats per dataset path and covariance estimator, shared by all sessions of the process
+_market_stats = FrameCache(max_entries=16)
+
+def load_market_stats(path, estimator:str='sample')->MarketStats:
+    """Market statistics of the price frame stored at path, built once per stored version of the dataset and estimator."""
+    return _market_stats.get((str(path), estimator), path, lambda: MarketStats.from_prices(load_frame(path), estimator=estimator))
+
+def mean_cov(df):
+    """mean vector and covariance of a returns dataframe (as arrays) or MarketStats (covariance model)"""
+    if isinstance(df, MarketStats):
+        return df.mean, df.cov
+    return df.mean().values, df.cov().values
+
+def trading_days(df)->int:
+    """number of trading days per year of a MarketStats, the default for returns dataframes"""
+    return df.ntd if isinstance(df, MarketStats) else NTD
+
 # calculate portfolio return
 def portfolio_returns(df, weights):
+    if isinstance(df, MarketStats):
+        return np.dot(df.mean, weights)
     return np.dot(df.mean(), weights)
 
 # calculate portfolios standard deviation
 def portfolio_std(df, weights):
-    return (np.dot(np.dot(df.cov(), weights), weights))**(1/2)*np.sqrt(250)
+    cov = df.cov if isinstance(df, MarketStats) else df.cov().values
+    return portfolio_stds(weights, cov, trading_days(df))[0]
 
-def portfolio_sharp_ratio(portfolio_return:float, portfolio_std:float, rfr:float)->float:
-    """Calculate the sharp ratio for a given portfolio df and a given risk-free-return "rfr"."""
-    ntd = 250 #  number of trading days
+def portfolio_sharp_ratio(portfolio_return:float, portfolio_std:float, rfr:float, stats:MarketStats=None)->float:
+    """Calculate the sharp ratio for a given portfolio df and a given risk-free-return "rfr".
+    The number of trading days is taken from stats if given."""
+    ntd = stats.ntd if stats is not None else NTD
     return np.divide(portfolio_return - rfr/ntd, portfolio_std) 
 
 
@@ -37,23 +94,80 @@ def portfolio_sharp_ratio(portfolio_return:float, portfolio_std:float, rfr:float
 # Modeling Functions
 #####################################################
 
-@st.cache
-def make_forecast(df, stock):
-    """make a forecast for stock in df"""
+def _forecast_frame(df, stock):
+    """prepare the ds/y frame expected by NeuralProphet for stock in df"""
     df_stock = df[[stock]].copy()
     df_stock = df_stock.rename(columns={stock:'y', 'Date':'ds'})
     df_stock['ds'] = df_stock.index
     df_stock = df_stock.reset_index()
-    df_stock = df_stock[['ds','y']]
-
-    params = {"n_forecasts": 1, "n_lags": 0}
-    # train model on all data
-    m = NeuralProphet(**params)
-    # fit model
-    metrics = m.fit(df_stock)
-    # Predictions
-    future = m.make_future_dataframe(df=df_stock, periods=365, n_historic_predictions=len(df_stock)) #we need to specify the number of days in future
-    forecast = m.predict(future)
+    return df_stock[['ds','y']]
+
+def _fine_tune_loader(m):
+    """Replacement of NeuralProphet´s _init_train_loader (neuralprophet 0.3.2) for fine-tuning a fitted model m:
+    the data is normalized with the fitted data params and the fitted seasonalities and network are kept,
+    fit would otherwise re-initialize all of them from the (shorter) fine-tuning data."""
+    from torch.utils.data import DataLoader
+    def init_train_loader(df_dict):
+        df_dict = m._normalize(df_dict)
+        dataset = m._create_dataset(df_dict, predict_mode=False)
+        m.config_train.set_auto_batch_epoch(n_data=len(dataset))
+        loader = DataLoader(dataset, batch_size=m.config_train.batch_size, shuffle=True)
+        m.optimizer = m.config_train.get_optimizer(m.model.parameters())
+        m.scheduler = m.config_train.get_scheduler(m.optimizer, steps_per_epoch=len(loader))
+        return loader
+    return init_train_loader
+
+def refresh_forecast(m, forecast, df_stock, n_fitted:int, epochs:int=5, n_context:int=730):
+    """Fine-tune the fitted model m on the days appended since it was fitted on the first n_fitted rows of df_stock
+    (plus n_context days before them) and regenerate only the new days and the forecast horizon.
+    Normalization, seasonalities and network of the fitted model are kept."""
+    fitted_epochs = m.config_train.epochs
+    m.config_train.epochs = epochs
+    m._init_train_loader = _fine_tune_loader(m)
+    try:
+        metrics = m.fit(df_stock.iloc[max(n_fitted - n_context, 0):])
+    finally:
+        # the patched loader must not be pickled with the model
+        del m._init_train_loader
+        m.config_train.epochs = fitted_epochs
+    future = m.make_future_dataframe(df=df_stock, periods=365, n_historic_predictions=len(df_stock) - n_fitted)
+    last_fitted_date = df_stock['ds'].iloc[n_fitted - 1]
+    forecast = pd.concat([forecast[forecast['ds'] <= last_fitted_date], m.predict(future)], ignore_index=True)
+    return forecast.drop_duplicates(subset='ds', keep='last').reset_index(drop=True)
+
+@timed()
+def make_forecast(df, stock, cache:ForecastCache=None, incremental:bool=True):
+    """make a forecast for stock in df. If a forecast cache is given, a model fitted on the very same series is reused.
+    With incremental=True a model fitted on an earlier version of the series, to which only new days were appended, 
+    is fine-tuned on the new days instead of training a new model on the whole series."""
+    if cache is not None:
+        cached = cache.get(stock, df[stock])
+        if cached is not None:
+            return cached[1]
+    df_stock = _forecast_frame(df, stock)
+
+    previous = cache.get_prefix(stock, df[stock]) if cache is not None and incremental else None
+    if previous is not None:
+        m, forecast, n_fitted = previous
+        try:
+            forecast = refresh_forecast(m, forecast, df_stock, n_fitted)
+        except (ValueError, RuntimeError, KeyError, AttributeError) as e:
+            # e.g. a model pickled by another neuralprophet version, fall back to training on all data
+            logger.warning('fine-tuning the forecast model of {} failed, training on all data: {!r}'.format(stock, e))
+            previous = None
+    if previous is None:
+        # imported on first use only, neuralprophet pulls in torch
+        from neuralprophet import NeuralProphet
+        params = {"n_forecasts": 1, "n_lags": 0}
+        # train model on all data
+        m = NeuralProphet(**params)
+        # fit model
+        metrics = m.fit(df_stock)
+        # Predictions
+        future = m.make_future_dataframe(df=df_stock, periods=365, n_historic_predictions=len(df_stock)) #we need to specify the number of days in future
+        forecast = m.predict(future)
+    if cache is not None:
+        cache.put(stock, df[stock], m, forecast)
     return forecast
 
 
@@ -68,30 +182,184 @@ def weight_creator(df):
     rand /= rand.sum()
     return rand
 
+def weight_matrix_creator(n_portfolios:int, n_assets:int, rng:np.random.Generator)->np.ndarray:
+    """Draw the weights of n_portfolios random portfolios at once as a (n_portfolios, n_assets) matrix, each row summing up to one."""
+    rand = rng.random((n_portfolios, n_assets))
+    rand /= rand.sum(axis=1, keepdims=True)
+    return rand
+
+def simulate_portfolios_chunks(df_returns:pd.DataFrame, n_experiments:int, rfr:float, chunk_size:int=10000, seed=None):
+    """Generator running the monte-carlo simulation in chunks of at most chunk_size portfolios.
+    Mean vector and covariance matrix of the daily returns are computed only once.
+    Yields (weights, returns, standard deviations, sharp ratios) arrays per chunk, so memory stays bounded by the chunk size."""
+    rng = np.random.default_rng(seed)
+    mean, cov = mean_cov(df_returns)
+    ntd = trading_days(df_returns)
+    n_assets = len(mean)
+    n_done = 0
+    while n_done < n_experiments:
+        n = min(chunk_size, n_experiments - n_done)
+        weights = weight_matrix_creator(n, n_assets, rng)
+        returns, stds, srs = batch_portfolio_kpis(weights, mean, cov, rfr, ntd)
+        n_done += n
+        yield weights, returns, stds, srs
+
+@timed()
+def simulate_portfolios(df_returns:pd.DataFrame, n_experiments:int, rfr:float, chunk_size:int=10000, seed=None):
+    """Run the monte-carlo simulation for n_experiments random portfolios using matrix operations.
+    Returns weights, returns, standard deviations and sharp ratios as arrays."""
+    chunks = list(simulate_portfolios_chunks(df_returns, n_experiments, rfr, chunk_size=chunk_size, seed=seed))
+    return tuple(np.concatenate(arrays) for arrays in zip(*chunks))
+
+KPI_COLUMNS = ['portfolio return', 'portfolio standard dev', 'portfolio sharp ratio']
+
+class SimulationResults:
+    """Container for monte-carlo simulation results.
+    Weights and KPIs of all portfolios are kept in one preallocated float array with one row per portfolio, 
+    the capacity doubles whenever the container is filled incrementally beyond its size."""
+
+    def __init__(self, stock_names:list, capacity:int=1024):
+        self.stock_names = list(stock_names)
+        self.columns = self.stock_names + KPI_COLUMNS
+        self._data = np.empty((max(int(capacity), 1), len(self.columns)))
+        self._size = 0
+
+    @classmethod
+    def from_arrays(cls, weights, sim_returns, sim_standard_deviations, sim_sharp_ratios, stock_names:list):
+        """Make a container holding exactly the given simulation results."""
+        weights = np.atleast_2d(np.asarray(weights, dtype=float))
+        results = cls(stock_names, capacity=len(weights))
+        results.append(weights, sim_returns, sim_standard_deviations, sim_sharp_ratios)
+        return results
+
+    def __len__(self):
+        return self._size
+
+    def _reserve(self, size:int):
+        """Make sure there is room for size rows, doubling the capacity as often as needed."""
+        capacity = len(self._data)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        data = np.empty((capacity, len(self.columns)))
+        data[:self._size] = self._data[:self._size]
+        self._data = data
+
+    def append(self, weights, sim_returns, sim_standard_deviations, sim_sharp_ratios):
+        """Append the results of one or more simulated portfolios."""
+        weights = np.atleast_2d(np.asarray(weights, dtype=float))
+        n = len(weights)
+        self._reserve(self._size + n)
+        k = len(self.stock_names)
+        rows = self._data[self._size:self._size + n]
+        rows[:, :k] = weights
+        rows[:, k] = sim_returns
+        rows[:, k + 1] = sim_standard_deviations
+        rows[:, k + 2] = sim_sharp_ratios
+        self._size += n
+
+    @property
+    def values(self)->np.ndarray:
+        """View on the filled rows of the underlying array: weights followed by the KPI columns."""
+        return self._data[:self._size]
+
+    @property
+    def weights(self)->np.ndarray:
+        return self.values[:, :len(self.stock_names)]
+
+    @property
+    def returns(self)->np.ndarray:
+        return self.values[:, len(self.stock_names)]
+
+    @property
+    def stds(self)->np.ndarray:
+        return self.values[:, len(self.stock_names) + 1]
+
+    @property
+    def sharp_ratios(self)->np.ndarray:
+        return self.values[:, len(self.stock_names) + 2]
+
+    def sort_by_std(self):
+        """Sort the portfolios in place by ascending standard deviation, as expected by FrontierIndex."""
+        self._data[:self._size] = self.values[np.argsort(self.stds, kind='stable')]
+
+    @property
+    def df(self)->pd.DataFrame:
+        """Simulation results as dataframe sharing memory with the container (no copy)."""
+        return pd.DataFrame(self.values, columns=self.columns, copy=False)
+
+    @property
+    def kpi_df(self)->pd.DataFrame:
+        """Key performance indicators as dataframe sharing memory with the container (no copy)."""
+        return pd.DataFrame(self.values[:, len(self.stock_names):], columns=KPI_COLUMNS, copy=False)
+
+class FrontierIndex:
+    """Efficient frontier index over simulated portfolios sorted by standard deviation.
+    For every position i of the sorted portfolios it keeps the row of the portfolio with the highest return 
+    among rows 0..i, so the best portfolio below a risk cap is found by binary search in O(log n)."""
+
+    def __init__(self, sorted_stds:np.ndarray, frontier_rows:np.ndarray):
+        self.stds = sorted_stds
+        self.frontier_rows = frontier_rows
+
+    @classmethod
+    def from_sorted(cls, sorted_stds:np.ndarray, returns:np.ndarray):
+        """Build the index from standard deviations sorted ascending and the returns in the same order."""
+        running_max = np.maximum.accumulate(returns)
+        rows = np.arange(len(returns))
+        # last row reaching the running maximum so far, i.e. the running argmax
+        frontier_rows = np.maximum.accumulate(np.where(returns >= running_max, rows, 0))
+        return cls(sorted_stds, frontier_rows)
+
+    @classmethod
+    def from_df(cls, df_frontier:pd.DataFrame, df_simulation:pd.DataFrame):
+        """Rebuild the index from a stored frontier dataframe (see to_df) and the std-sorted simulation dataframe."""
+        return cls(df_simulation['portfolio standard dev'].values, df_frontier['frontier row'].values.astype(np.int64))
+
+    def to_df(self)->pd.DataFrame:
+        """Frontier rows as dataframe, to be stored next to the simulation results."""
+        return pd.DataFrame({'frontier row': self.frontier_rows})
+
+    def best_under(self, max_risk:float):
+        """Row of the portfolio with maximal return and standard deviation not above max_risk, None if there is none."""
+        i = np.searchsorted(self.stds, max_risk, side='right') - 1
+        if i < 0:
+            return None
+        return int(self.frontier_rows[i])
+
+    def min_variance_row(self)->int:
+        """Row of the portfolio with minimal standard deviation."""
+        return 0
+
 def sim2weights_df(weights:list, stock_names:list)->pd.DataFrame:
     """Make dataframe given the portfolios´s weights from the simulations.  
     """
-    # initialize weights dataframe with the weights from first simulation
-    df_weights = pd.DataFrame(weights[0]).T
-    for weights in weights[1:]:
-        df_weights = df_weights.append(pd.DataFrame(weights).T, ignore_index=True) 
-    # rename columns
-    df_weights.columns = stock_names
-    return df_weights
-
-def sim2kpi_df(sim_returns:list, sim_standard_deviations:list, sim_sharp_ratios:list)->pd.DataFrame:
-    """Generate key performance indicator dataframe from simulation returns, simulation standard deviations and simulation sharp ratios."""
+    return pd.DataFrame(np.atleast_2d(np.asarray(weights, dtype=float)), columns=list(stock_names))
+
+def sim2kpi_df(sim_returns, sim_standard_deviations:list=None, sim_sharp_ratios:list=None)->pd.DataFrame:
+    """Generate key performance indicator dataframe from simulation returns, simulation standard deviations and simulation sharp ratios.
+    Alternatively pass a SimulationResults container as the only argument."""
+    if isinstance(sim_returns, SimulationResults):
+        return sim_returns.kpi_df
     return pd.DataFrame(data={'portfolio return': sim_returns, 
                                'portfolio standard dev': sim_standard_deviations, 
                                'portfolio sharp ratio': sim_sharp_ratios})
 
-def sim2_df(sim_returns:list, sim_standard_deviations:list, sim_sharp_ratios:list, weights:list, stock_names:list)->pd.DataFrame:
-    """Save monte-carlo simulation results in dataframe"""
-    sim_weights_df = sim2weights_df(weights, stock_names)
-    sim_kpi_df = sim2kpi_df(sim_returns, sim_standard_deviations, sim_sharp_ratios) 
-    return sim_weights_df.join(sim_kpi_df)
+def sim2_df(sim_returns, sim_standard_deviations:list=None, sim_sharp_ratios:list=None, weights:list=None, stock_names:list=None)->pd.DataFrame:
+    """Save monte-carlo simulation results in dataframe.
+    Alternatively pass a SimulationResults container as the only argument."""
+    if isinstance(sim_returns, SimulationResults):
+        return sim_returns.df
+    return SimulationResults.from_arrays(weights, sim_returns, sim_standard_deviations, sim_sharp_ratios, stock_names).df
 
 # find mimimum risk (i.e. variance) portfolio
-def min_variance_portfolio(df_simulation:pd.DataFrame, stocknames:list)->pd.DataFrame:
-    """Get weights of the portfolio with minimal variance or risk. Input dataframe of the simulation and a list of the stock names"""
-    return df_simulation.sort_values(by='portfolio standard dev')[stocknames].iloc[0,:].values
\ No newline at end of file
+def min_variance_portfolio(df_simulation, stocknames:list=None, frontier:FrontierIndex=None)->np.ndarray:
+    """Get weights of the portfolio with minimal variance or risk. Input dataframe (or SimulationResults container) of the simulation and a list of the stock names.
+    If the FrontierIndex of the (std-sorted) simulation is given, the portfolio is looked up without scanning the simulation."""
+    if isinstance(df_simulation, SimulationResults):
+        row = frontier.min_variance_row() if frontier is not None else np.argmin(df_simulation.stds)
+        return df_simulation.weights[row]
+    if frontier is not None:
+        return df_simulation.iloc[frontier.min_variance_row()][stocknames].values
+    return df_simulation.loc[df_simulation['portfolio standard dev'].idxmin(), stocknames].values
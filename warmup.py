@@ -0,0 +1,67 @@
+import os
+import time
+import logging
+import importlib
+import threading
+
+
+#####################################################
+# Background Warm-Up
+#####################################################
+# The pages and their heavy dependencies are imported lazily on first use. The optional warm-up preloads them in a
+# background thread after startup, so the first user of a page does not wait for the imports, together with the market
+# statistics of the most recently used datasets. Enabled with the environment variable WARMUP=1,
+# WARMUP=full also imports the forecasting libraries (neuralprophet and torch) and loads the most recently used
+# forecast models of the forecast store into memory.
+
+logger = logging.getLogger('warmup')
+
+_mode = os.environ.get('WARMUP', '0')
+_started = False
+_lock = threading.Lock()
+
+PAGE_MODULES = ['eda', 'optimize']
+FORECAST_MODULES = ['neuralprophet']
+
+def warmup(full:bool=False, n_datasets:int=3, n_forecasts:int=10):
+    """Import the page modules and preload the n_datasets most recently used datasets.
+    If full, also import the forecasting libraries and preload the n_forecasts most recently used forecast models."""
+    t_start = time.perf_counter()
+    for module in PAGE_MODULES + (FORECAST_MODULES if full else []):
+        try:
+            importlib.import_module(module)
+        except Exception as error:
+            logger.warning('warm-up failed to import {}: {!r}'.format(module, error))
+    try:
+        from storage import frame_exists
+        from utils import load_market_stats
+        from workspace import DatasetStore
+        store = DatasetStore()
+        for version in store.versions()[:n_datasets]:
+            path = store.path(version) / 'data'
+            if frame_exists(path):
+                load_market_stats(path)
+    except Exception as error:
+        logger.warning('warm-up failed to preload the datasets: {!r}'.format(error))
+    if full:
+        try:
+            from batch_forecast import MODELPATH
+            from forecast_store import ForecastCache
+            ForecastCache(MODELPATH).preload(n_forecasts)
+        except Exception as error:
+            logger.warning('warm-up failed to preload the forecast models: {!r}'.format(error))
+    logger.info('warm-up done in {:.1f} s'.format(time.perf_counter() - t_start))
+
+def start(mode:str=None)->bool:
+    """Start the warm-up in a daemon thread, once per process. mode '1' or 'full' (default: environment variable WARMUP),
+    '0' does nothing. Returns whether the warm-up was started by this call."""
+    global _started
+    mode = _mode if mode is None else mode
+    if mode not in ('1', 'full'):
+        return False
+    with _lock:
+        if _started:
+            return False
+        _started = True
+    threading.Thread(target=warmup, kwargs={'full': mode == 'full'}, name='warmup', daemon=True).start()
+    return True
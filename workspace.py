@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import uuid
+import fcntl
+import shutil
+import hashlib
+from contextlib import contextmanager
+from pathlib import Path
+from storage import frame_exists, frame_version, load_frame, save_frame
+
+
+# set directories
+rootdir = os.getcwd()
+DATAPATH = Path(rootdir) / 'data'
+WORKSPACEPATH = DATAPATH / 'workspace'
+
+
+#####################################################
+# Content-Addressed Dataset Store
+#####################################################
+# Every dataset version is a directory of stored frames (see storage.save_frame) named after the hash of its files.
+# Versions are written to a temporary directory and renamed into place, so they are complete and immutable once visible.
+# Sessions keep the hashes of their versions instead of writing to shared paths, identical versions are stored once.
+# Refs map the inputs of a computation (e.g. dataset and simulation parameters) to the version computed from them,
+# so an identical computation requested by another session is reused instead of repeated.
+# Versions neither used nor committed for max_age seconds are garbage-collected.
+
+def _hash_directory(path:Path)->str:
+    """hash of the names and contents of all files in a directory"""
+    digest = hashlib.sha256()
+    for file_path in sorted(p for p in path.rglob('*') if p.is_file()):
+        digest.update(str(file_path.relative_to(path)).encode())
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024**2), b''):
+                digest.update(block)
+    return digest.hexdigest()[:32]
+
+class DatasetStore:
+    """Content-addressed store of immutable dataset versions shared by all sessions and processes."""
+
+    # time of the last garbage collection per store directory in this process
+    _last_collection = {}
+
+    def __init__(self, root=WORKSPACEPATH, max_age:float=7*24*3600, collect_interval:float=3600):
+        self.root = Path(root)
+        for name in ('versions', 'refs', 'tmp'):
+            (self.root / name).mkdir(parents=True, exist_ok=True)
+        self.max_age = max_age
+        self.collect_interval = collect_interval
+
+    @contextmanager
+    def _locked(self, name:str='store'):
+        """hold an exclusive lock across processes"""
+        with open(self.root / (name + '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def path(self, version:str)->Path:
+        """directory of a version, e.g. load_frame(store.path(version) / 'data')"""
+        return self.root / 'versions' / version
+
+    def exists(self, version:str)->bool:
+        return version is not None and self.path(version).is_dir()
+
+    def versions(self)->list:
+        """all versions, most recently used first"""
+        paths = [path for path in (self.root / 'versions').iterdir() if path.is_dir()]
+        return [path.name for path in sorted(paths, key=lambda path: path.stat().st_mtime, reverse=True)]
+
+    def touch(self, version:str):
+        """mark a version as used, so it is not garbage-collected"""
+        try:
+            os.utime(self.path(version))
+        except FileNotFoundError:
+            pass
+
+    def commit(self, write)->str:
+        """Create a version by calling write(directory) on a fresh temporary directory, returns the version hash.
+        If an identical version exists already, the new copy is discarded."""
+        tmp_path = self.root / 'tmp' / uuid.uuid4().hex
+        tmp_path.mkdir()
+        try:
+            write(tmp_path)
+            version = _hash_directory(tmp_path)
+            try:
+                os.rename(tmp_path, self.path(version))
+            except OSError:
+                # renaming onto an existing (identical) version fails
+                if not self.exists(version):
+                    raise
+                shutil.rmtree(tmp_path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        self.touch(version)
+        self._maybe_collect_garbage()
+        return version
+
+    @staticmethod
+    def _ref_name(key:dict)->str:
+        return hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+    def lookup(self, key:dict)->str:
+        """version computed from the inputs key, None if there is none (anymore)"""
+        ref_path = self.root / 'refs' / self._ref_name(key)
+        try:
+            version = ref_path.read_text()
+        except FileNotFoundError:
+            return None
+        if not self.exists(version):
+            return None
+        self.touch(version)
+        return version
+
+    def set_ref(self, key:dict, version:str):
+        """record version as computed from the inputs key"""
+        ref_path = self.root / 'refs' / self._ref_name(key)
+        tmp_path = ref_path.with_name(ref_path.name + '.' + uuid.uuid4().hex + '.tmp')
+        tmp_path.write_text(version)
+        os.replace(tmp_path, ref_path)
+
+    def get_or_commit(self, key:dict, write)->str:
+        """Version computed from the inputs key, committed with write(directory) if it does not exist yet.
+        Concurrent requests for the same key wait for the first one instead of computing it again."""
+        version = self.lookup(key)
+        if version is not None:
+            return version
+        with self._locked('ref-' + self._ref_name(key)):
+            version = self.lookup(key)
+            if version is None:
+                version = self.commit(write)
+                self.set_ref(key, version)
+        return version
+
+    def collect_garbage(self, max_age:float=None)->list:
+        """Delete versions neither used nor committed for max_age seconds, their refs and abandoned temporary directories.
+        Returns the deleted versions."""
+        max_age = self.max_age if max_age is None else max_age
+        now = time.time()
+        removed = []
+        with self._locked():
+            for path in (self.root / 'versions').iterdir():
+                try:
+                    if now - path.stat().st_mtime > max_age:
+                        shutil.rmtree(path)
+                        removed.append(path.name)
+                except FileNotFoundError:
+                    pass
+            for ref_path in (self.root / 'refs').iterdir():
+                try:
+                    if not self.exists(ref_path.read_text()):
+                        ref_path.unlink()
+                except (FileNotFoundError, UnicodeDecodeError):
+                    pass
+            for path in (self.root / 'tmp').iterdir():
+                if now - path.stat().st_mtime > 24*3600:
+                    shutil.rmtree(path, ignore_errors=True)
+        return removed
+
+    def _maybe_collect_garbage(self):
+        """collect garbage at most once per collect_interval in this process"""
+        key = str(self.root)
+        now = time.time()
+        if now - DatasetStore._last_collection.get(key, 0) > self.collect_interval:
+            DatasetStore._last_collection[key] = now
+            self.collect_garbage()
+
+
+
+#####################################################
+# Session Workspace
+#####################################################
+
+def import_dataset(store:DatasetStore, legacy_path=DATAPATH / 'data')->str:
+    """Version of the price frame the batch pipeline wrote to legacy_path, imported into the store once per saved version.
+    None if there is no such frame."""
+    if legacy_path is None or not frame_exists(legacy_path):
+        return None
+    return store.get_or_commit({'import': str(legacy_path), 'version': frame_version(legacy_path)},
+                               lambda path: save_frame(load_frame(legacy_path), path / 'data'))
+
+def simulation_key(dataset_version:str, estimator:str, mode:str, n_portfolios:int, rfr:float)->dict:
+    """inputs of the simulated portfolios (mode monte-carlo) or efficient frontier (mode exact) of a dataset version"""
+    return {'simulation of': dataset_version, 'estimator': estimator, 'mode': mode,
+            'n_points' if mode == 'exact' else 'n_experiments': n_portfolios, 'rfr': rfr}
+
+def pipeline_simulation_key(dataset_version:str, estimator:str, mode:str)->dict:
+    """key of the latest simulation (or frontier) the batch pipeline computed for a dataset version"""
+    return {'pipeline simulation of': dataset_version, 'estimator': estimator, 'mode': mode}
+
+def swarm_key(dataset_version:str, estimator:str, rfr:float, max_risk:float)->dict:
+    """inputs of the particle swarm weights of a dataset version"""
+    return {'swarm of': dataset_version, 'estimator': estimator, 'rfr': rfr, 'max_risk': round(max_risk, 6)}
+
+def session_dataset(session_state, store:DatasetStore, legacy_path=DATAPATH / 'data')->str:
+    """Version of the price dataset the session works on: the one it downloaded last, otherwise the one written
+    by the batch pipeline to legacy_path (imported into the store once). None if there is no dataset yet."""
+    version = session_state.get('dataset_version')
+    if store.exists(version):
+        store.touch(version)
+        return version
+    version = import_dataset(store, legacy_path)
+    if version is not None:
+        session_state['dataset_version'] = version
+    return version
+
+def session_simulation(session_state, store:DatasetStore, dataset_version:str, estimator:str, mode:str)->str:
+    """Version of the last simulation (mode monte-carlo) or frontier (mode exact) the session computed on the dataset version
+    with the covariance estimator, otherwise the batch pipeline´s one (see pipeline_simulation_key). None if there is none."""
+    version = session_state.get('simulation_versions', {}).get((dataset_version, estimator, mode))
+    if store.exists(version):
+        store.touch(version)
+        return version
+    return store.lookup(pipeline_simulation_key(dataset_version, estimator, mode))
+
+def set_session_simulation(session_state, dataset_version:str, estimator:str, mode:str, simulation_version:str):
+    """make simulation_version the session´s simulation of the dataset version, estimator and mode"""
+    simulations = dict(session_state.get('simulation_versions', {}))
+    simulations[(dataset_version, estimator, mode)] = simulation_version
+    session_state['simulation_versions'] = simulations